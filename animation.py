@@ -0,0 +1,68 @@
+# Sprite animation.
+# Animations are declared once, as a range of frames in a strip (one of the
+# lists of an assets.FrameSet), how long each frame shows and whether it
+# loops. Sprites don't keep their own timers: a Layout's AnimationClock is
+# ticked once per step and sets the image of every sprite playing something.
+# Looping animations run in phase with the clock, so when one moves on to its
+# next frame the frame index is worked out once and handed to all of its
+# sprites, and on steps where nothing changes frame the tick costs nothing
+# per sprite.
+
+from collections import namedtuple
+
+# frames first to first + count - 1, each shown for rate milliseconds of simulated time
+Animation = namedtuple("Animation", "first count rate loop", defaults=(True,))
+
+# frame 0 of the player strip is the standing frame
+PLAYER_WALK = Animation(1, 4, 100)
+ENEMY_WALK = Animation(0, 4, 100)
+
+
+class AnimationClock:
+    """Sets sprite images from one timestep.SimClock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.playing = {}   # animation -> {sprite: strip}
+        self.started = {}   # sprite -> start time, for animations that don't loop
+        self.shown = {}     # animation -> frame index its sprites were last given
+
+    def frame(self, animation, start=0):
+        """Index in the strip that animation shows now, for a sprite that started it at start."""
+        steps = int((self.clock.now - start) // animation.rate)
+        if animation.loop:
+            return animation.first + steps % animation.count
+        return animation.first + min(steps, animation.count - 1)
+
+    def play(self, sprite, animation, strip):
+        """Animate sprite with frames from strip. It moves to them on the animation's next frame."""
+        sprites = self.playing.get(animation)
+        if sprites is None:
+            sprites = self.playing[animation] = {}
+            self.shown[animation] = self.frame(animation)
+        if sprites.get(sprite) is strip:
+            return
+        self.stop(sprite)
+        sprites[sprite] = strip
+        if not animation.loop:
+            self.started[sprite] = self.clock.now
+
+    def stop(self, sprite):
+        """Leave sprite on the frame it shows now."""
+        for sprites in self.playing.values():
+            sprites.pop(sprite, None)
+        self.started.pop(sprite, None)
+
+    def tick(self):
+        """Give every playing sprite the frame its animation is on now."""
+        for animation, sprites in self.playing.items():
+            if not animation.loop:
+                for sprite, strip in sprites.items():
+                    sprite.image = strip[self.frame(animation, self.started[sprite])]
+                continue
+            index = self.frame(animation)
+            if index == self.shown[animation]:
+                continue
+            self.shown[animation] = index
+            for sprite, strip in sprites.items():
+                sprite.image = strip[index]
@@ -0,0 +1,235 @@
+# This class handles sprite sheets
+# https://www.pygame.org/wiki/Spritesheet
+# I've added some code to fail if the file wasn't found..
+# Note: When calling images_at the rect is the format:
+# (x, y, x + offset, y + offset)
+
+import threading
+from collections import namedtuple
+
+import pygame
+
+# Walk frames facing right and the same frames mirrored, shared by every sprite using them
+FrameSet = namedtuple("FrameSet", "right left")
+
+
+class SpriteSheet:
+
+    def __init__(self, filename):
+        """Load the sheet."""
+        try:
+            self.sheet = pygame.image.load(filename).convert()
+        except pygame.error as e:
+            print(f"Unable to load spritesheet image: {filename}")
+            raise SystemExit(e)
+
+    def image_at(self, rectangle, colorkey=None):
+        """Load a specific image from a specific rectangle."""
+        """rectangle is a tuple with (x, y, x+offset, y+offset)"""
+        rect = pygame.Rect(rectangle)
+        image = pygame.Surface(rect.size).convert()
+        image.blit(self.sheet, (0, 0), rect)
+        if colorkey is not None:
+            if colorkey == -1:
+                colorkey = image.get_at((0, 0))
+            image.set_colorkey(colorkey, pygame.RLEACCEL)
+        return image
+
+    def images_at(self, rects, colorkey=None):
+        """Load a whole bunch of images and return them as a list."""
+        return [self.image_at(rect, colorkey) for rect in rects]
+
+    def load_strip(self, rect, image_count, colorkey=None):
+        """Load a whole strip of images, and return them as a list."""
+        tups = [(rect[0] + rect[2] * x, rect[1], rect[2], rect[3])
+                for x in range(image_count)]
+        return self.images_at(tups, colorkey)
+
+    def load_grid_images(self, num_rows, num_cols, x_margin=0, x_padding=0,
+                         y_margin=0, y_padding=0, width=None, height=None, colorkey=None):
+        """Load a grid of images.
+        x_margin is the space between the top of the sheet and top of the first
+        row. x_padding is space between rows. Assumes symmetrical padding on
+        left and right.  Same reasoning for y. Calls self.images_at() to get a
+        list of images.
+        """
+
+        return self.images_at(self.grid_rects(num_rows, num_cols, x_margin, x_padding,
+                                              y_margin, y_padding, width, height), colorkey)
+
+    def grid_rects(self, num_rows, num_cols, x_margin=0, x_padding=0,
+                   y_margin=0, y_padding=0, width=None, height=None):
+        """Return the source rects used by load_grid_images()."""
+        sheet_rect = self.sheet.get_rect()
+        sheet_width, sheet_height = sheet_rect.size
+
+        # To calculate the size of each sprite, subtract the two margins,
+        #   and the padding between each row, then divide by num_cols.
+        # Same reasoning for y.
+
+        if width and height:
+            x_sprite_size = width
+            y_sprite_size = height
+        else:
+            x_sprite_size = (sheet_width - 2 * x_margin
+                             - (num_cols - 1) * x_padding) / num_cols
+            y_sprite_size = (sheet_height - 2 * y_margin
+                             - (num_rows - 1) * y_padding) / num_rows
+
+        sprite_rects = []
+        for row_num in range(num_rows):
+            for col_num in range(num_cols):
+                # Position of sprite rect is margin + one sprite size
+                #   and one padding size for each row. Same for y.
+                x = x_margin + col_num * (x_sprite_size + x_padding)
+                y = y_margin + row_num * (y_sprite_size + y_padding)
+                sprite_rect = (x, y, x_sprite_size, y_sprite_size)
+                sprite_rects.append(sprite_rect)
+
+        return sprite_rects
+
+
+class AssetCache:
+    """Process-wide cache of sliced and scaled sheet images.
+
+    Layout is rebuilt on every death and level change, so every surface is
+    keyed by (file, source rect, colorkey, target size, flip) and only decoded
+    and scaled the first time it is asked for.
+    """
+
+    def __init__(self):
+        self.sheets = {}
+        self.images = {}
+        self.hits = 0
+        self.misses = 0
+
+    def sheet(self, filename):
+        """Return the SpriteSheet for filename, loading it once."""
+        sheet = self.sheets.get(filename)
+        if sheet is None:
+            sheet = self.sheets[filename] = SpriteSheet(filename)
+        return sheet
+
+    def image(self, filename, rect, colorkey=None, size=None, flip=False):
+        """Return the image at rect, optionally scaled to size and flipped horizontally."""
+        key = (filename, tuple(rect), colorkey, size, flip)
+        image = self.images.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        if flip:
+            image = pygame.transform.flip(self.image(filename, rect, colorkey, size), True, False)
+        elif size is not None:
+            image = pygame.transform.scale(self.image(filename, rect, colorkey), size)
+        else:
+            image = self.sheet(filename).image_at(rect, colorkey)
+        self.images[key] = image
+        return image
+
+    def grid(self, filename, num_rows, num_cols, x_margin=0, x_padding=0,
+             y_margin=0, y_padding=0, width=None, height=None, colorkey=None, flip=False):
+        """Cached version of SpriteSheet.load_grid_images()."""
+        rects = self.sheet(filename).grid_rects(num_rows, num_cols, x_margin, x_padding,
+                                                y_margin, y_padding, width, height)
+        return [self.image(filename, rect, colorkey, flip=flip) for rect in rects]
+
+    def frames(self, filename, num_rows, num_cols, x_margin=0, x_padding=0,
+               y_margin=0, y_padding=0, width=None, height=None, colorkey=None):
+        """A FrameSet of a grid, with each frame and its mirror image made once per process."""
+        args = (filename, num_rows, num_cols, x_margin, x_padding, y_margin, y_padding, width, height, colorkey)
+        return FrameSet(self.grid(*args), self.grid(*args, flip=True))
+
+    def stats(self):
+        return {"sheets": len(self.sheets), "images": len(self.images),
+                "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        self.sheets.clear()
+        self.images.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+cache = AssetCache()
+
+
+# Fonts and sounds made at import time (settings.py) are only loaded the first
+# time they are used, so importing settings needs neither the font module nor
+# an audio device. load_all() loads whatever is left, e.g. from a background
+# thread while the start screen shows.
+lazy = []
+lazy_lock = threading.Lock()
+mixer_ok = None
+
+
+def mixer_ready():
+    """Start the mixer on first use. False if there is no audio device."""
+    global mixer_ok
+    if mixer_ok is None:
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            mixer_ok = True
+        except pygame.error:
+            mixer_ok = False
+    return mixer_ok
+
+
+class LazyFont:
+    """A pygame Font opened the first time it is used."""
+
+    def __init__(self, filename, size):
+        self.filename = filename
+        self.size = size
+        self.font = None
+        lazy.append(self)
+
+    def load(self):
+        with lazy_lock:
+            if self.font is None:
+                if not pygame.font.get_init():
+                    pygame.font.init()
+                self.font = pygame.font.Font(self.filename, self.size)
+        return self.font
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+class Silent:
+    """Stands in for a Sound when there is no audio device."""
+
+    def play(self, *args, **kwargs):
+        return None
+
+    def stop(self):
+        pass
+
+
+class LazySound:
+    """A pygame Sound decoded the first time it is used, silent without an audio device."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.sound = None
+        lazy.append(self)
+
+    def load(self):
+        with lazy_lock:
+            if self.sound is None:
+                self.sound = pygame.mixer.Sound(self.filename) if mixer_ready() else Silent()
+        return self.sound
+
+    def play(self, *args, **kwargs):
+        return self.load().play(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+def load_all():
+    """Load every lazy font and sound that hasn't been used yet."""
+    for resource in list(lazy):
+        resource.load()
@@ -0,0 +1,243 @@
+# Benchmarks.
+# Times level construction, per frame update and draw, the kill/goal checks
+# and sprite sheet slicing on the real levels and on synthetic ones (wider
+# copies, crowds of enemies and the generated levels of levelgen.CORPUS),
+# then writes the numbers to a JSON file and compares them with a stored
+# baseline:
+#
+#     python bench.py --save-baseline     # once, before a change
+#     python bench.py                     # after it, prints the ratios
+#
+# Results are per call in milliseconds. A benchmark is flagged when its
+# median is more than --threshold times the baseline's.
+
+import headless
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import pygame as pg
+
+import levelgen
+import sprites
+from settings import *
+from assets import SpriteSheet
+from inputs import KeyState
+from sprites import Layout
+
+RESULTS = "bench_results.json"
+BASELINE = "bench_baseline.json"
+
+RIGHT_JUMP = KeyState(False, True, True)
+
+# Steps of play before timing starts on a fresh Layout, and most steps timed on one
+WARMUP = 30
+RUN = 60
+
+
+def widen(level_layout, factor):
+    """level_layout repeated factor times side by side, with the player only in the first copy."""
+    rows = []
+    for row in level_layout:
+        copy = row.replace("p", "0")
+        rows.append(",".join([row] + [copy] * (factor - 1)))
+    return rows
+
+
+def crowd(level_layout, count):
+    """level_layout with up to count enemies dropped into the empty cells of its top rows."""
+    rows = [row.split(",") for row in level_layout]
+    placed = 0
+    for row in range(len(rows) // 2):
+        for col in range(len(rows[row])):
+            if placed < count and rows[row][col] == "0":
+                rows[row][col] = "x"
+                placed += 1
+    return [",".join(row) for row in rows]
+
+
+def stats(times):
+    """Per call statistics in milliseconds of a list of call times in milliseconds."""
+    times = sorted(times)
+    calls = len(times)
+    return {
+        "calls": calls,
+        "mean_ms": sum(times) / calls,
+        "min_ms": times[0],
+        "p50_ms": times[calls // 2],
+        "p99_ms": times[min(int(calls * 0.99), calls - 1)],
+    }
+
+
+def measure(func, calls):
+    """Run func calls times and return per call statistics in milliseconds."""
+    times = []
+    clock = time.perf_counter
+    for _ in range(calls):
+        start = clock()
+        func()
+        times.append((clock() - start) * 1000)
+    return stats(times)
+
+
+def play(level_layout, level, frames, display):
+    """Time frames steps of play, each one update, draw, Kill_Player and Next_Level like Game.step.
+
+    Every run of play is on a fresh Layout: WARMUP untimed steps, then at most
+    RUN timed ones, and a death or finished level ends it early. The step that
+    ends a run isn't counted, so the numbers are for a player alive on
+    screen (not falling off the bottom of the level) and Kill_Player never times the
+    call that removes an enemy. Returns the call times, the number of runs
+    that ended early and the last Layout.
+    """
+    times = {"update": [], "draw": [], "kill_player": [], "next_level": []}
+    clock = time.perf_counter
+    ended = 0
+    while len(times["update"]) < frames:
+        layout = Layout(level_layout, TILE_SIZE, level)
+        timed = 0
+        for step in range(WARMUP + RUN):
+            if step >= WARMUP and len(times["update"]) >= frames:
+                break
+            t0 = clock()
+            layout.update(RIGHT_JUMP)
+            t1 = clock()
+            layout.draw(display)
+            t2 = clock()
+            alive = layout.Kill_Player() is None
+            t3 = clock()
+            playing = alive and layout.Next_Level() is None
+            t4 = clock()
+            # falling out of the level, Kill_Player only notices once it's well below the screen
+            playing = playing and layout.player.rect.top < WIN_HEIGHT
+            if not playing:
+                ended += 1
+                break
+            if step >= WARMUP:
+                for key, start, end in (("update", t0, t1), ("draw", t1, t2),
+                                        ("kill_player", t2, t3), ("next_level", t3, t4)):
+                    times[key].append((end - start) * 1000)
+                timed += 1
+        if not timed:
+            raise RuntimeError("the player doesn't survive the warm-up")
+    return times, ended, layout
+
+
+def bench_level(name, level_layout, level, results, frames, builds):
+    results[f"build/{name}"] = measure(lambda: Layout(level_layout, TILE_SIZE, level), builds)
+
+    display = pg.Surface((WIN_WIDTH, WIN_HEIGHT)).convert()
+    times, ended, layout = play(level_layout, level, frames, display)
+    for key, calls in times.items():
+        results[f"{key}/{name}"] = stats(calls)
+    results[f"ended/{name}"] = ended
+    results[f"enemies/{name}"] = len(layout.enemy_rects())
+    results[f"memory/{name}"] = layout.memory_report()
+
+
+def run(frames=300, builds=5, scales=(10, 100, 1000), crowds=(200, 500), corpus=levelgen.CORPUS, match=""):
+    headless.init()
+    results = {}
+
+    def wanted(name):
+        return match in name
+
+    sheet = SpriteSheet("images/characters.png")
+    if wanted("load_grid_images"):
+        results["load_grid_images"] = measure(
+            lambda: sheet.load_grid_images(1, 23, player_x, player_x_pad, player_y, player_y_pad,
+                                           width, height, -1), frames)
+
+    for level, level_layout in enumerate(LEVELS):
+        name = f"level{level + 1}"
+        if wanted(name):
+            bench_level(name, level_layout, level, results, frames, builds)
+
+    for factor in scales:
+        name = f"wide{factor}x"
+        if wanted(name):
+            bench_level(name, widen(LEVELS[0], factor), 0, results, frames, builds)
+
+    for count in crowds:
+        name = f"crowd{count}"
+        if wanted(name):
+            bench_level(name, crowd(widen(LEVELS[0], 10), count), 0, results, frames, builds)
+
+    for name, params in corpus.items():
+        if wanted(name):
+            bench_level(name, levelgen.generate(**params), 0, results, frames, builds)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print each benchmark's median against the baseline and return the names that regressed."""
+    regressed = []
+    for name, result in results.items():
+        if not isinstance(result, dict) or "p50_ms" not in result:
+            continue
+        before = baseline.get(name)
+        now = result["p50_ms"]
+        if not isinstance(before, dict):
+            print(f"{name:28} {now:10.4f} ms   (new)")
+            continue
+        ratio = now / before["p50_ms"] if before["p50_ms"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print(f"{name:28} {now:10.4f} ms   {before['p50_ms']:10.4f} ms   x{ratio:.2f}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark level building, updates, collisions and drawing.")
+    parser.add_argument("--frames", type=int, default=300, help="calls per per-frame benchmark")
+    parser.add_argument("--builds", type=int, default=5, help="Layout constructions per level")
+    parser.add_argument("--quick", action="store_true", help="skip the 1000x wide level and stress100k")
+    parser.add_argument("--match", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--out", default=RESULTS)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 on any regression")
+    parser.add_argument("--swarm", action="store_true", help="run with SWARM enemies")
+    args = parser.parse_args()
+
+    if args.swarm:
+        sprites.SWARM = True
+
+    scales = (10, 100) if args.quick else (10, 100, 1000)
+    corpus = levelgen.CORPUS
+    if args.quick:
+        corpus = {name: params for name, params in corpus.items() if params["width"] <= 10000}
+    results = run(args.frames, args.builds, scales, corpus=corpus, match=args.match)
+    report = {
+        "python": platform.python_version(),
+        "pygame": pg.version.ver,
+        "platform": platform.platform(),
+        "swarm": sprites.SWARM,
+        "results": results,
+    }
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    except (OSError, ValueError, KeyError):
+        baseline = {}
+    regressed = compare(results, baseline, args.threshold)
+    if regressed and args.strict:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from settings import *
+
+
+class Camera:
+    """Horizontal scroll position of a level.
+
+    Tiles, enemies and the player all keep fixed world coordinates. Scrolling
+    only changes x, which is subtracted from world positions when drawing.
+    """
+
+    def __init__(self, width=WIN_WIDTH, height=WIN_HEIGHT, margin=200, speed=2):
+        self.x = 0
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.speed = speed
+        self.change_x = 0
+
+    def to_screen(self, x):
+        return x - self.x
+
+    def to_world(self, x):
+        return x + self.x
+
+    def columns(self, tile_size, x=None):
+        """First and last tile column that are at least partly on screen, with the camera at x."""
+        if x is None:
+            x = self.x
+        return int(x // tile_size), int((x + self.width - 1) // tile_size)
+
+    def follow(self, player, tile_grid, left, right):
+        """Scroll when the player walks into the margins, keeping them in place on screen.
+
+        left and right are whether those keys are held this frame.
+        """
+        screen_x = player.rect.x - self.x
+
+        for tile in tile_grid.query_move(player.rect, player.change_x, 0):
+            if tile[1].colliderect(player.rect.x + player.change_x,
+                                   player.rect.y,
+                                   player.rect.width,
+                                   player.rect.height):
+                self.change_x = 0
+
+        if self.margin < screen_x < self.width - self.margin:
+            self.change_x = 0
+
+        if screen_x >= self.width - self.margin:
+            if player.change_x > 0:
+                player.change_x = 0
+                self.change_x = self.speed
+        if screen_x <= self.margin:
+            if player.change_x < 0:
+                player.change_x = 0
+                self.change_x = -self.speed
+        if not left and not right:
+            self.change_x = 0
+
+        for tile in tile_grid.query_move(player.rect, player.change_x, 0):
+            if tile[1].colliderect(player.rect.x + player.change_x,
+                                   player.rect.y,
+                                   player.rect.width,
+                                   player.rect.height):
+                self.change_x = 0
+
+        # the player moves with the camera so it stays put on screen, and the
+        # camera takes the player's rounded step so x stays a whole pixel
+        before = player.rect.x
+        player.rect.x += self.change_x
+        self.x += player.rect.x - before
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+
+import pygame
+
+from settings import *
+
+
+class ChunkCache:
+    """Static tile layers pre-rendered into fixed size, opaque chunk surfaces.
+
+    Chunks are chunk_cols x chunk_rows tiles. They are built the first time
+    they come into view by filling with background and drawing the tiles of
+    each TileGrid in grids in order, and the least recently drawn ones are
+    dropped once more than max_chunks are held. Being opaque, a chunk is a
+    plain copy to blit and needs no colorkey or RLE encoding, which SDL
+    would otherwise redo on the first blit to the screen.
+    """
+
+    def __init__(self, grids, tile_size, chunk_cols=CHUNK_COLS, chunk_rows=CHUNK_ROWS,
+                 max_chunks=CHUNK_CACHE_SIZE, background=SKY):
+        self.grids = grids
+        self.background = background
+        self.tile_size = tile_size
+        self.chunk_cols = chunk_cols
+        self.chunk_rows = chunk_rows
+        self.chunk_width = chunk_cols * tile_size
+        self.chunk_height = chunk_rows * tile_size
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()
+        self.built = 0
+
+    def chunk(self, cx, cy):
+        """Return the surface for chunk (cx, cy), or None if it has no tiles."""
+        key = (cx, cy)
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            return self.chunks[key]
+
+        surface = self.build(cx, cy)
+        self.chunks[key] = surface
+        if len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return surface
+
+    def build(self, cx, cy):
+        left = cx * self.chunk_width
+        top = cy * self.chunk_height
+        tiles = [tile for grid in self.grids
+                 for tile in grid.query(left, top, self.chunk_width, self.chunk_height)
+                 if left <= tile[1].x < left + self.chunk_width
+                 and top <= tile[1].y < top + self.chunk_height]
+        if not tiles:
+            return None
+
+        surface = pygame.Surface((self.chunk_width, self.chunk_height)).convert()
+        surface.fill(self.background)
+        surface.blits([(tile[0], (tile[1].x - left, tile[1].y - top)) for tile in tiles], False)
+        self.built += 1
+        return surface
+
+    def invalidate(self, col, row):
+        """Drop the chunk holding tile (col, row) so it is rebuilt next time it is drawn."""
+        self.chunks.pop((col // self.chunk_cols, row // self.chunk_rows), None)
+
+    def invalidate_columns(self, col_start, col_end):
+        """Drop every chunk overlapping columns col_start up to (not including) col_end."""
+        for key in list(self.chunks):
+            if key[0] * self.chunk_cols < col_end and (key[0] + 1) * self.chunk_cols > col_start:
+                del self.chunks[key]
+
+    def clear(self):
+        self.chunks.clear()
+
+    def visible(self, offset_x, view):
+        """(cx, cy) of every chunk on screen at offset_x."""
+        cx_start = offset_x // self.chunk_width
+        cx_end = (offset_x + view.width - 1) // self.chunk_width
+        row_min = min(grid.row_min for grid in self.grids)
+        row_max = max(grid.row_max for grid in self.grids)
+        cy_start = max(row_min, 0) // self.chunk_rows
+        cy_end = min(row_max, (view.height - 1) // self.tile_size) // self.chunk_rows
+        return [(cx, cy) for cy in range(cy_start, cy_end + 1) for cx in range(cx_start, cx_end + 1)]
+
+    def warm(self, offset_x, view):
+        """Build the chunks visible at offset_x ahead of the first draw."""
+        for cx, cy in self.visible(offset_x, view):
+            self.chunk(cx, cy)
+
+    def draw(self, display, offset_x, view):
+        batch = []
+        for cx, cy in self.visible(offset_x, view):
+            surface = self.chunk(cx, cy)
+            if surface is not None:
+                batch.append((surface, (cx * self.chunk_width - offset_x, cy * self.chunk_height)))
+        display.blits(batch, False)
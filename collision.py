@@ -0,0 +1,225 @@
+# Spatial indexing for collision checks.
+# Tiles are (image, rect) tuples like everywhere else in sprites.py.
+
+import sys
+from bisect import bisect_left
+from operator import attrgetter
+
+import pygame
+
+left_of = attrgetter("rect.left")
+
+
+class TileGrid:
+    """Uniform grid of tiles, one byte per cell.
+
+    A cell holds the index of its tile's image in images, 0 for an empty
+    cell, stored column by column like level.Level. With block_cols the
+    cells are kept in blocks of that many columns, made when a tile is put
+    in them and dropped when their columns are removed, so a streamed level
+    only holds the blocks around the camera; without it there is one block
+    covering every column. The (image, rect) tuples handed out by query()
+    and friends are only made for tiles something asked about, and at most
+    max_made of them are kept for reuse. Tiles are cell_size squares lined
+    up with the cells, so query() looks at the cells a rect overlaps plus
+    one to the left and above, the same cells the tile at their top left
+    corner could reach.
+    """
+
+    def __init__(self, cell_size, cols, rows, images, block_cols=None, max_made=4096):
+        self.cell_size = cell_size
+        self.cols = cols
+        self.rows = rows
+        self.images = images
+        self.block_cols = block_cols or max(cols, 1)
+        self.blocks = {}    # block index -> bytearray of its cells
+        self.dense = block_cols is None
+        if self.dense:
+            self.blocks[0] = bytearray(cols * rows)
+        self.made = {}
+        self.max_made = max_made
+        self.count = 0
+        self.row_min = 0
+        self.row_max = -1
+
+    def put(self, col, row, code):
+        """Place the tile with image images[code] in a cell, or clear it with code 0."""
+        block_index, local = divmod(col, self.block_cols)
+        block = self.blocks.get(block_index)
+        if block is None:
+            if not code:
+                return
+            block = self.blocks[block_index] = bytearray(self.block_cols * self.rows)
+        index = local * self.rows + row
+        self.count += (code != 0) - (block[index] != 0)
+        block[index] = code
+        self.made.pop(col * self.rows + row, None)
+        if code:
+            if self.row_max < self.row_min:
+                self.row_min = self.row_max = row
+            else:
+                self.row_min = min(self.row_min, row)
+                self.row_max = max(self.row_max, row)
+
+    def tile(self, col, row):
+        block_index, local = divmod(col, self.block_cols)
+        block = self.blocks.get(block_index)
+        code = block[local * self.rows + row] if block is not None else 0
+        if not code:
+            return None
+        index = col * self.rows + row
+        return self.made.get(index) or self.make(index, code)
+
+    def make(self, index, code):
+        if len(self.made) >= self.max_made:
+            self.made.clear()
+        col, row = divmod(index, self.rows)
+        size = self.cell_size
+        tile = self.made[index] = (self.images[code], pygame.Rect(col * size, row * size, size, size))
+        return tile
+
+    def remove_columns(self, col_start, col_end):
+        """Drop every tile in columns col_start up to (not including) col_end."""
+        col_start = max(col_start, 0)
+        col_end = min(col_end, self.cols)
+        if col_end <= col_start:
+            return
+        rows = self.rows
+        block_cols = self.block_cols
+        for block_index in range(col_start // block_cols, (col_end - 1) // block_cols + 1):
+            block = self.blocks.get(block_index)
+            if block is None:
+                continue
+            first = block_index * block_cols
+            start = (max(col_start, first) - first) * rows
+            end = (min(col_end, first + block_cols) - first) * rows
+            self.count -= (end - start) - block.count(0, start, end)
+            if start == 0 and end == len(block) and not self.dense:
+                del self.blocks[block_index]
+            else:
+                block[start:end] = bytes(end - start)
+        self.made.clear()
+
+    def nbytes(self):
+        """Bytes held by the blocks of cells."""
+        return sum(sys.getsizeof(block) for block in self.blocks.values())
+
+    def cells_in(self, col_start, col_end, row_start, row_end):
+        """Tiles in the inclusive cell range, in row then column order."""
+        rows = self.rows
+        if col_start < 0:
+            col_start = 0
+        if col_end >= self.cols:
+            col_end = self.cols - 1
+        if row_start < 0:
+            row_start = 0
+        if row_end >= rows:
+            row_end = rows - 1
+
+        # (block, first index, end index, index of the block's first cell) for each block in range
+        spans = []
+        block_cols = self.block_cols
+        for block_index in range(col_start // block_cols, col_end // block_cols + 1):
+            block = self.blocks.get(block_index)
+            if block is not None:
+                first = block_index * block_cols
+                spans.append((block, (max(col_start, first) - first) * rows,
+                              (min(col_end, first + block_cols - 1) - first) * rows + 1, first * rows))
+
+        found = []
+        made = self.made
+        for row in range(row_start, row_end + 1):
+            for block, first, last, base in spans:
+                for index in range(first + row, last + row, rows):
+                    code = block[index]
+                    if code:
+                        found.append(made.get(base + index) or self.make(base + index, code))
+        return found
+
+    def query(self, x, y, w, h):
+        """Return the tiles that may overlap the area, in row then column order."""
+        size = self.cell_size
+        return self.cells_in(int(x // size) - 1, int((x + w) // size),
+                             int(y // size) - 1, int((y + h) // size))
+
+    def columns(self, col_start, col_end):
+        """Return every tile in columns col_start to col_end inclusive."""
+        return self.cells_in(col_start, col_end, self.row_min, self.row_max)
+
+    def tiles(self):
+        return self.columns(0, self.cols - 1)
+
+    def query_rect(self, rect):
+        return self.query(rect.x, rect.y, rect.width, rect.height)
+
+    def query_move(self, rect, dx, dy):
+        """Return the tiles that may block rect moving by dx and/or dy."""
+        top = rect.y + min(dy, 0)
+        bottom = rect.bottom + max(dy, 0)
+        if dy < 0:
+            # Hitting a ceiling sets dy to tile.bottom - rect.top, and the
+            # remaining tiles are then checked with that dy, so also cover
+            # everything a tile overlapping rect could push it down to.
+            bottom = rect.bottom + rect.height + self.cell_size
+        size = self.cell_size
+        left = rect.x + min(dx, 0)
+        return self.cells_in(int(left // size) - 1, int((rect.right + max(dx, 0)) // size),
+                             int(top // size) - 1, int(bottom // size))
+
+
+class SweepAndPrune:
+    """Broadphase for moving entities, anything with a rect.
+
+    rebuild() sorts the entities on rect.left once per frame, after they have
+    moved. query() then finds what overlaps a rect with a binary search over
+    that order, and pairs() sweeps it once for every overlapping pair, so
+    checks grow with the number of entities instead of their square.
+    """
+
+    def __init__(self, entities=()):
+        self.rebuild(entities)
+
+    def rebuild(self, entities):
+        self.entities = sorted(entities, key=left_of)
+        self.lefts = list(map(left_of, self.entities))
+        self.max_width = max((entity.rect.width for entity in self.entities), default=0)
+
+    def query(self, rect):
+        """Entities whose rect overlaps rect, in left to right order."""
+        # anything further left than this ends before rect starts
+        start = bisect_left(self.lefts, rect.left - self.max_width + 1)
+        end = bisect_left(self.lefts, rect.right)
+        return [entity for entity in self.entities[start:end] if rect.colliderect(entity.rect)]
+
+    def collide(self, entities, kill=False):
+        """Like pygame.sprite.groupcollide(entities, <these>, False, kill).
+
+        Returns {entity: [overlapping entities]}, and with kill calls kill()
+        on every entity from this set that was hit.
+        """
+        hits = {}
+        for entity in entities:
+            found = self.query(entity.rect)
+            if found:
+                hits[entity] = found
+        if kill and hits:
+            killed = set()
+            for found in hits.values():
+                killed.update(found)
+            for entity in killed:
+                entity.kill()
+            self.rebuild(entity for entity in self.entities if entity not in killed)
+        return hits
+
+    def pairs(self):
+        """Every pair of entities in the set whose rects overlap."""
+        found = []
+        active = []
+        for entity in self.entities:
+            rect = entity.rect
+            active = [other for other in active if other.rect.right > rect.left]
+            for other in active:
+                if rect.colliderect(other.rect):
+                    found.append((other, entity))
+            active.append(entity)
+        return found
@@ -0,0 +1,127 @@
+from settings import *
+from level import open_level
+from sprites import Layout
+from inputs import KeyboardInput
+from preload import Preloader
+from profiler import profile
+
+
+class Game:
+    """Level progression and the per frame game rules, without any drawing.
+
+    game_state is -1 on the start screen, 0 while playing, 1 after dying and
+    2 once every level is done. main.py drives this from a window and
+    headless.py without one.
+
+    With preload, the Layouts for dying and for finishing the current level
+    are built in the background ahead of time, see preload.py. So is the
+    first level while the start screen shows: layout is only waited for
+    when it is first used.
+    """
+
+    def __init__(self, controls=None, levels=LEVELS, level=0, preload=PRELOAD):
+        self.controls = controls if controls is not None else KeyboardInput()
+        self.levels = levels
+        self.next = level
+        self.game_state = -1
+        self._layout = None
+        self.frames = 0
+        self.recorder = None
+        self.preloader = Preloader(self.build) if preload else None
+        self.preload_at = None
+        self.reset_later()
+
+    @property
+    def layout(self):
+        if self._layout is None and self.next < len(self.levels):
+            self._layout = self.preloader.take(self.next)
+        return self._layout
+
+    @layout.setter
+    def layout(self, layout):
+        self._layout = layout
+
+    def build(self, level):
+        layout = Layout(self.levels[level], TILE_SIZE, level)
+        layout.prepare()
+        return layout
+
+    def reset_game(self):
+        if self.next < len(self.levels):
+            if self.preloader is None:
+                self.layout = Layout(self.levels[self.next], TILE_SIZE, self.next)
+            else:
+                self.layout = self.preloader.take(self.next)
+                # the worker competes for the GIL, so let the new level get going first
+                self.preload_at = self.frames + PRELOAD_DELAY
+        else:
+            self.game_state = 2
+
+    def reset_later(self):
+        """reset_game() for the start screen: with preload the Layout is built on the worker."""
+        if self.preloader is None or self.next >= len(self.levels):
+            self.reset_game()
+        else:
+            self.layout = None
+            self.preloader.want(self.next)
+            self.preload_at = self.frames + PRELOAD_DELAY
+
+    def preload(self):
+        """Have the preloader build the levels needed for dying and for finishing this one."""
+        self.preloader.want(*[level for level in (self.next, self.next + 1) if level < len(self.levels)])
+
+    def reload(self, level):
+        """Pick up an edited level file, see hotreload.py.
+
+        The level being played takes the new cells in place, see
+        Layout.reload_level(), or restarts if its size changed. Returns the
+        number of cells that changed there, or None.
+        """
+        if self.preloader is not None:
+            self.preloader.discard(level)
+        changed = None
+        if level == self.next and self._layout is not None:
+            changed = self._layout.reload_level(open_level(self.levels[level]))
+            if changed is None:
+                self.reset_game()
+        elif level == self.next:
+            # still being built on the preload thread
+            self.reset_later()
+        if self.preloader is not None and self.preload_at is not None and self.frames > self.preload_at:
+            self.preload()
+        return changed
+
+    def skip(self):
+        self.next += 1
+        self.reset_game()
+
+    def restart(self):
+        self.next = 0
+        self.game_state = -1
+        self.reset_later()
+        if self.recorder is not None:
+            self.recorder.restart()
+
+    def step(self):
+        """Run one frame of play."""
+        keys = self.controls.poll()
+        if keys.skip:
+            self.skip()
+
+        self.layout.update(keys)
+
+        if self.layout.Kill_Player() == False:
+            self.game_state = 1
+            self.reset_game()
+
+        elif self.layout.Next_Level() == False:
+            self.next += 1
+            self.reset_game()
+
+        self.layout.Cont()
+        profile.lap("checks")
+        self.frames += 1
+        if self.frames == self.preload_at:
+            self.preload()
+        if self.recorder is not None:
+            self.recorder.record(keys, self)
@@ -0,0 +1,116 @@
+# Headless simulation.
+# Runs the game rules on SDL's dummy video and audio drivers with no drawing,
+# no display flips and no frame cap, driven by a scripted input provider:
+#
+#     python headless.py --level 2 --frames 100000 --policy random
+#
+# Import this module before settings (or anything that imports it) so the
+# dummy drivers are picked before pygame is initialised.
+
+import os
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+import argparse
+import random
+import time
+
+import pygame as pg
+
+from settings import *
+from game import Game
+from inputs import KeyState, ScriptedInput
+
+
+def init():
+    """Start pygame without a window. Surfaces still need a display mode to convert() against."""
+    pg.init()
+    if pg.display.get_surface() is None:
+        pg.display.set_mode((1, 1))
+
+
+def idle(frame):
+    return KeyState(False, False, False)
+
+
+def right(frame):
+    return KeyState(False, True, False)
+
+
+def right_jump(frame):
+    return KeyState(False, True, True)
+
+
+def random_policy(seed=0):
+    """Seeded random walk that mostly heads right, changing keys every few frames."""
+    def policy(frame):
+        rng = random.Random(seed * 1000003 + frame // 8)
+        go_right = rng.random() < 0.7
+        go_left = not go_right and rng.random() < 0.6
+        return KeyState(go_left, go_right, rng.random() < 0.3)
+    return policy
+
+
+POLICIES = {
+    "idle": idle,
+    "right": right,
+    "right-jump": right_jump,
+    "random": random_policy(),
+}
+
+
+def simulate(controls, level=0, frames=10000, stop_on_death=False, levels=LEVELS):
+    """Step a Game for up to frames frames as fast as possible.
+
+    Stops early when every level is done, or on the first death with
+    stop_on_death. Returns the Game and a dict of counters.
+    """
+    init()
+    game = Game(controls, levels, level)
+    game.game_state = 0
+    deaths = 0
+    levels_done = 0
+
+    start = time.perf_counter()
+    while game.frames < frames:
+        current = game.next
+        game.step()
+        if game.game_state == 1:
+            deaths += 1
+            if stop_on_death:
+                break
+            game.game_state = 0
+        elif game.next != current:
+            levels_done += 1
+        if game.game_state == 2:
+            break
+    elapsed = time.perf_counter() - start
+
+    return game, {
+        "frames": game.frames,
+        "seconds": elapsed,
+        "frames_per_second": game.frames / elapsed if elapsed else 0.0,
+        "deaths": deaths,
+        "levels_done": levels_done,
+        "level": game.next,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the game without a window.")
+    parser.add_argument("--level", type=int, default=0)
+    parser.add_argument("--frames", type=int, default=10000)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--stop-on-death", action="store_true")
+    args = parser.parse_args()
+
+    game, stats = simulate(ScriptedInput(POLICIES[args.policy]), args.level, args.frames,
+                           args.stop_on_death)
+    print(f"{stats['frames']} frames in {stats['seconds']:.3f}s "
+          f"({stats['frames_per_second']:.0f} frames/s, {stats['frames_per_second'] / FPS:.0f}x real time)")
+    print(f"deaths: {stats['deaths']}  levels finished: {stats['levels_done']}  on level: {stats['level']}")
+
+
+if __name__ == "__main__":
+    main()
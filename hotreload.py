@@ -0,0 +1,59 @@
+# Level hot reload.
+# While the game runs, a LevelWatcher checks the modification time of every
+# level file in the game's levels each HOT_RELOAD_INTERVAL frames. When one
+# changes, Game.reload() patches the edited cells into the level being played
+# and throws away any preloaded copy, so the player, enemies and camera carry
+# on where they were. Levels written inline in settings.py aren't files and
+# aren't watched:
+#
+#     python main.py --levels levels/stress1k.txt
+
+import os
+import time
+
+from settings import *
+
+
+class LevelWatcher:
+    """Polls the level files of a Game. Call poll() once per frame."""
+
+    def __init__(self, game, interval=HOT_RELOAD_INTERVAL):
+        self.game = game
+        self.interval = interval
+        self.frame = 0
+        self.mtimes = {level: self.mtime(path) for level, path in self.files()}
+
+    def files(self):
+        return [(level, path) for level, path in enumerate(self.game.levels) if isinstance(path, str)]
+
+    @staticmethod
+    def mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def poll(self):
+        """Reload the level files that changed since the last check. Returns their level numbers."""
+        self.frame += 1
+        if self.frame < self.interval:
+            return []
+        self.frame = 0
+
+        reloaded = []
+        for level, path in self.files():
+            mtime = self.mtime(path)
+            if mtime is None or mtime == self.mtimes.get(level):
+                continue
+            self.mtimes[level] = mtime
+            start = time.perf_counter()
+            try:
+                changed = self.game.reload(level)
+            except (OSError, ValueError) as e:
+                # most likely caught half written, the next save is picked up again
+                print(f"Unable to reload level {path}: {e}")
+                continue
+            if changed is not None:
+                print(f"Reloaded {path}: {changed} cells in {(time.perf_counter() - start) * 1000:.1f} ms")
+            reloaded.append(level)
+        return reloaded
@@ -0,0 +1,53 @@
+# Input providers.
+# Anything with a poll() method returning a KeyState once per frame can drive
+# the game: the real keyboard in main.py, or a script when running headless.
+
+from collections import namedtuple
+
+import pygame
+
+KeyState = namedtuple("KeyState", "left right jump skip", defaults=(False,))
+
+IDLE = KeyState(False, False, False)
+
+
+def read_keyboard():
+    keys = pygame.key.get_pressed()
+    return KeyState(keys[pygame.K_LEFT], keys[pygame.K_RIGHT], keys[pygame.K_SPACE])
+
+
+class KeyboardInput:
+    """Held keys come from pygame.key.get_pressed(), the q skip key from KEYDOWN events."""
+
+    def __init__(self):
+        self.skip = False
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_q:
+            self.skip = True
+
+    def poll(self):
+        state = read_keyboard()._replace(skip=self.skip)
+        self.skip = False
+        return state
+
+
+class ScriptedInput:
+    """Key states from a list, or from a function of the frame number.
+
+    A list that runs out keeps returning IDLE.
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.frame = 0
+
+    def poll(self):
+        if callable(self.script):
+            state = self.script(self.frame)
+        elif self.frame < len(self.script):
+            state = self.script[self.frame]
+        else:
+            state = IDLE
+        self.frame += 1
+        return state
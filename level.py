@@ -0,0 +1,325 @@
+# Level compiler.
+# Levels are written as lists of comma separated rows, one symbol per cell
+# (see LAYOUT in settings.py). compile_level() turns them into a Level, a
+# compact grid of uint8 codes, using the LEGEND table below. Compiled levels
+# are also written to a small binary cache file so they load with one read.
+#
+# Levels can also live in external files, either as text (one row per line)
+# or already compiled (.lvl). open_level() memory-maps the compiled form, so a
+# very wide level only costs memory for the columns that are actually read.
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+
+import pygame
+
+import assets
+
+SHEET = "images/sheet.png"
+CACHE_DIR = "cache/levels"
+
+# Layers a symbol can be on
+EMPTY = 0
+SOLID = 1    # tile_list, collides with the player and enemies
+BACK = 2     # back_list, drawn over the solid tiles, no collision
+GOAL = 3     # back_list and end_list, touching it finishes the level
+PLAYER = 4
+ENEMY = 5
+
+# Position of each 16x16 tile in the tile sheet
+TILE_IMAGES = {
+    "rock_green1": (112, 0),
+    "rock_green2": (112 + 16, 0),
+    "rock_green3": (112 + 16 * 2, 0),
+    "rock_green_left": (112 + 16, 16),
+    "rock_green_right": (112 + 16 * 2, 16),
+    "grey_rock_green1": (112, 16 * 2),
+    "grey_rock_green2": (112 + 16, 16 * 2),
+    "grey_rock_green3": (112 + 16 * 2, 16 * 2),
+    "grey_rock_green_left": (112 + 16, 16 * 3),
+    "grey_rock_green_right": (112 + 16 * 2, 16 * 3),
+    "rocky": (112, 16),
+    "grey_rocky": (112, 16 * 3),
+    "rock_lwall": (112 + 16 * 3, 16),
+    "rock_rwall": (112 + 16 * 5, 16),
+    "rock_left": (112 + 16 * 3, 0),
+    "rock_right": (112 + 16 * 5, 0),
+    "rock_floor": (112 + 16 * 4, 0),
+    "grey_rock_lwall": (112 + 16 * 3, 16 * 3),
+    "grey_rock_rwall": (112 + 16 * 5, 16 * 3),
+    "grey_rock_left": (112 + 16 * 3, 16 * 2),
+    "grey_rock_right": (112 + 16 * 5, 16 * 2),
+    "grey_rock_floor": (112 + 16 * 4, 16 * 2),
+    "inside": (112 + 16 * 4, 16),
+    "rock_pillar_top": (112 + 16 * 6, 0),
+    "rock_pillar": (112 + 16 * 6, 16),
+    "grey_rock_pillar_top": (112 + 16 * 6, 16 * 2),
+    "grey_rock_pillar": (112 + 16 * 6, 16 * 3),
+    "grass_ltop": (112 + 16 * 4, 16 * 4),
+    "grass_l": (112 + 16 * 4, 16 * 5),
+    "grass_lbot": (112 + 16 * 4, 16 * 6),
+    "grass_top": (112 + 16 * 5, 16 * 4),
+    "grass_mid": (112 + 16 * 5, 16 * 5),
+    "grass_bot": (112 + 16 * 5, 16 * 6),
+    "grass_rtop": (112 + 16 * 4, 16 * 4),
+    "grass_r": (112 + 16 * 4, 16 * 5),
+    "grass_rbot": (112 + 16 * 4, 16 * 6),
+}
+
+# symbol -> (images drawn in that cell, bottom first; layer)
+LEGEND = {
+    "0": ((), EMPTY),
+    "1": (("rock_green1",), SOLID),
+    "2": (("rock_green2",), SOLID),
+    "3": (("rock_green3",), SOLID),
+    "L": (("rock_green_left",), SOLID),
+    "R": (("rock_green_right",), SOLID),
+    "4": (("grey_rock_green1",), SOLID),
+    "5": (("grey_rock_green2",), SOLID),
+    "6": (("grey_rock_green3",), SOLID),
+    "l": (("grey_rock_green_left",), SOLID),
+    "r": (("grey_rock_green_right",), SOLID),
+    "U": (("rocky",), SOLID),
+    "u": (("grey_rocky",), SOLID),
+    "N": (("rock_lwall",), SOLID),
+    "M": (("rock_rwall",), SOLID),
+    "A": (("rock_left", "rock_pillar_top"), SOLID),
+    "D": (("rock_right",), SOLID),
+    "n": (("grey_rock_lwall",), BACK),
+    "m": (("grey_rock_rwall",), BACK),
+    "a": (("grey_rock_left", "grey_rock_pillar_top"), SOLID),
+    "d": (("grey_rock_right",), SOLID),
+    "F": (("rock_floor",), SOLID),
+    "f": (("grey_rock_floor",), SOLID),
+    "-": (("inside",), BACK),
+    "I": (("rock_pillar",), SOLID),
+    "i": (("grey_rock_pillar",), SOLID),
+    "7": (("grass_ltop",), GOAL),
+    "y": (("grass_l",), GOAL),
+    "j": (("grass_lbot",), GOAL),
+    "8": (("grass_top",), GOAL),
+    "=": (("grass_mid",), GOAL),
+    "k": (("grass_bot",), GOAL),
+    "9": (("grass_rtop",), GOAL),
+    "o": (("grass_r",), GOAL),
+    ";": (("grass_r",), GOAL),
+    "p": ((), PLAYER),
+    "x": ((), ENEMY),
+}
+
+# Code stored in the grid for each symbol, 0 is always empty
+SYMBOLS = list(LEGEND)
+CODES = {symbol: code for code, symbol in enumerate(SYMBOLS)}
+LAYERS = bytes(LEGEND[symbol][1] for symbol in SYMBOLS)
+# code for each byte of a row of one character symbols, unknown ones are empty
+TRANSLATE = bytes(CODES.get(chr(byte), 0) for byte in range(256))
+
+MAGIC = b"LVL1"
+HEADER = struct.Struct("<4sII16s")
+LEGEND_DIGEST = hashlib.md5(repr(sorted(LEGEND.items())).encode()).digest()
+
+
+class Level:
+    """A compiled level: width x height uint8 codes stored column by column."""
+
+    def __init__(self, width, height, cells):
+        self.width = width
+        self.height = height
+        self.cells = cells
+
+    def code_at(self, col, row):
+        if 0 <= col < self.width and 0 <= row < self.height:
+            return self.cells[col * self.height + row]
+        return 0
+
+    def layer_at(self, col, row):
+        return LAYERS[self.code_at(col, row)]
+
+    def symbol_at(self, col, row):
+        return SYMBOLS[self.code_at(col, row)]
+
+    def find(self, code, block=1 << 16):
+        """(col, row) of the first cell holding code, scanning column by column."""
+        needle = bytes((code,))
+        cells = self.cells
+        for start in range(0, len(cells), block):
+            index = bytes(cells[start:start + block]).find(needle)
+            if index >= 0:
+                return divmod(start + index, self.height)
+        return None
+
+    def rows(self):
+        """Rebuild the comma separated rows the level was compiled from."""
+        return [",".join(SYMBOLS[self.cells[col * self.height + row]] for col in range(self.width))
+                for row in range(self.height)]
+
+
+def compile_level(level_layout):
+    """Compile a list of comma separated rows into a Level."""
+    rows = [row.split(",") for row in level_layout]
+    height = len(rows)
+    width = max((len(row) for row in rows), default=0)
+
+    # unknown symbols were ignored by the old parser, so they compile to empty cells
+    cells = array("B", bytes(width * height))
+    codes = CODES
+    for row_num, row in enumerate(rows):
+        for col_num, symbol in enumerate(row):
+            cells[col_num * height + row_num] = codes.get(symbol, 0)
+    return Level(width, height, cells)
+
+
+def save_level(level, path):
+    # written to a file of its own next to path and moved over it, so levels still mapped
+    # from the old file stay readable and writers of the same path don't clash
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, level.width, level.height, LEGEND_DIGEST))
+            f.write(level.cells.tobytes())
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+
+def load_level(path):
+    """Load a level written by save_level(), or return None if it is stale or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, width, height, digest = HEADER.unpack_from(data)
+    if magic != MAGIC or digest != LEGEND_DIGEST or len(data) != HEADER.size + width * height:
+        return None
+    cells = array("B")
+    cells.frombytes(memoryview(data)[HEADER.size:])
+    return Level(width, height, cells)
+
+
+def read_level_file(path):
+    """Compile a text level file without holding more than one row of text at a time."""
+    height = 0
+    width = 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                height += 1
+                width = max(width, line.count(",") + 1)
+
+    cells = array("B", bytes(width * height))
+    codes = CODES
+    with open(path) as f:
+        row_num = 0
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            packed = line.replace(",", "")
+            if len(packed) == line.count(",") + 1 and packed.isascii():
+                # every symbol is one character, so translate the whole row at once
+                cells[row_num:row_num + len(packed) * height:height] = array("B", packed.encode().translate(TRANSLATE))
+            else:
+                for col_num, symbol in enumerate(line.split(",")):
+                    cells[col_num * height + row_num] = codes.get(symbol, 0)
+            row_num += 1
+    return Level(width, height, cells)
+
+
+def open_level(path):
+    """Open a level file as a memory-mapped Level.
+
+    Text files are compiled once into CACHE_DIR (keyed by path, size and
+    modification time) and the compiled file is mapped from there.
+    """
+    if not path.endswith(".lvl"):
+        info = os.stat(path)
+        key = hashlib.md5(f"{os.path.abspath(path)}:{info.st_size}:{info.st_mtime_ns}".encode()).hexdigest()
+        compiled = os.path.join(CACHE_DIR, key + ".lvl")
+        if map_level(compiled) is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            try:
+                save_level(read_level_file(path), compiled)
+            except OSError:
+                # another process or thread may have compiled it first, its file is used below
+                pass
+        path = compiled
+
+    level = map_level(path)
+    if level is None:
+        raise ValueError(f"Not a compiled level file: {path}")
+    return level
+
+
+def map_level(path):
+    """Memory-map a file written by save_level(), or return None if it is stale or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, width, height, digest = HEADER.unpack_from(data)
+    if magic != MAGIC or digest != LEGEND_DIGEST or len(data) != HEADER.size + width * height:
+        return None
+    return Level(width, height, memoryview(data)[HEADER.size:])
+
+
+def compile_cached(level_layout):
+    """compile_level() backed by a binary cache file per distinct layout."""
+    key = hashlib.md5("\n".join(level_layout).encode()).hexdigest()
+    path = os.path.join(CACHE_DIR, key + ".lvl")
+    level = load_level(path)
+    if level is None:
+        level = compile_level(level_layout)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            save_level(level, path)
+        except OSError:
+            pass
+    return level
+
+
+def tile_images(tile_size):
+    """Tile surface for every code, scaled to tile_size, or None for codes that aren't drawn."""
+    images = []
+    for symbol in SYMBOLS:
+        names = LEGEND[symbol][0]
+        layers = [assets.cache.image(SHEET, TILE_IMAGES[name] + (16, 16), (255, 255, 255),
+                                     (tile_size, tile_size)) for name in names]
+        if not layers:
+            images.append(None)
+        elif len(layers) == 1:
+            images.append(layers[0])
+        else:
+            images.append(_composite(names, layers, tile_size))
+    return images
+
+
+_composites = {}
+
+
+def _composite(names, layers, tile_size):
+    """Flatten tiles that are stacked in one cell into a single colorkeyed surface."""
+    key = (names, tile_size)
+    image = _composites.get(key)
+    if image is None:
+        image = pygame.Surface((tile_size, tile_size)).convert()
+        image.fill((255, 255, 255))
+        for layer in layers:
+            image.blit(layer, (0, 0))
+        image.set_colorkey((255, 255, 255), pygame.RLEACCEL)
+        _composites[key] = image
+    return image
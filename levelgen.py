@@ -0,0 +1,130 @@
+# Procedural level generator.
+# Makes levels of any width out of the symbols in level.LEGEND, for scaling
+# tests and benchmarks. A level is a run of ground platforms ("L2...2R" on
+# top of "N--M" walls, or an "A" on an "I" pillar when one column wide)
+# with the player on the first one, enemies standing on the others and the
+# grass goal block at the right end. Gaps are at most MAX_GAP columns and
+# platforms only step up one row where there is no gap, which keeps every
+# level within reach of the player's jump. The same seed always gives the
+# same level:
+#
+#     python levelgen.py --width 10000 --enemies 500 --seed 1 --out stress
+#     python levelgen.py --corpus levels
+#
+# writes stress.txt (one row per line, like any text level file) and
+# stress.lvl (compiled, see level.save_level()).
+
+import argparse
+import os
+import random
+
+from level import compile_level, save_level
+
+HEIGHT = 11
+MAX_GAP = 1
+MIN_PLATFORM = 1
+MAX_PLATFORM = 8
+TOP_ROW = 5     # highest row a platform's top can be on
+START_ROW = 8
+SAFE_COLS = 6   # no enemies this close to the player
+GOAL = ["7,8,8", "y,=,=", "y,=,="]
+
+# The standard stress levels, see bench.py
+CORPUS = {
+    "stress1k": {"width": 1000, "density": 0.8, "enemies": 50, "seed": 1},
+    "stress10k": {"width": 10000, "density": 0.8, "enemies": 500, "seed": 2},
+    "stress100k": {"width": 100000, "density": 0.8, "enemies": 5000, "seed": 3},
+}
+
+
+def platform(grid, col_start, col_end, top):
+    """Ground from col_start up to (not including) col_end, its top on row top."""
+    rows = len(grid)
+    if col_end - col_start == 1:
+        grid[top][col_start] = "A"
+        for row in range(top + 1, rows):
+            grid[row][col_start] = "I"
+        return
+    for col in range(col_start, col_end):
+        first = col == col_start
+        last = col == col_end - 1
+        grid[top][col] = "L" if first else "R" if last else "2"
+        for row in range(top + 1, rows):
+            grid[row][col] = "N" if first else "M" if last else "-"
+
+
+def generate(width, density=0.8, enemies=20, seed=0, height=HEIGHT):
+    """A level width columns wide as a list of comma separated rows.
+
+    density is how likely a platform is to be followed by more ground
+    rather than a gap, 1 for no gaps at all. enemies is how many enemies to
+    place, fewer if there isn't room for them.
+    """
+    if width < len(GOAL[0].split(",")) + MAX_PLATFORM or height <= START_ROW:
+        raise ValueError(f"level too small: {width}x{height}")
+    rng = random.Random(seed)
+    grid = [["0"] * width for _ in range(height)]
+    goal_cols = len(GOAL[0].split(","))
+
+    # (column, row) of every cell an enemy could stand in
+    spots = []
+    col = 0
+    top = START_ROW
+    while True:
+        length = rng.randint(MIN_PLATFORM, MAX_PLATFORM)
+        last = col + length + MAX_GAP + MAX_PLATFORM + goal_cols >= width
+        if last:
+            length = width - col
+        platform(grid, col, col + length, top)
+        spots.extend((c, top - 1) for c in range(col, col + length))
+        col += length
+        if last:
+            break
+
+        gap = 0
+        while gap < MAX_GAP and rng.random() > density:
+            gap += 1
+        col += gap
+        # rows count down, so -1 is a step up
+        step = rng.choice((0, 0, 1) if gap else (-1, 0, 0, 1))
+        top = min(max(top + step, TOP_ROW), height - 2)
+
+    # the player starts on the first platform and the goal sits on the last
+    grid[START_ROW - 1][0] = "p"
+    for i, row in enumerate(GOAL):
+        grid[top - len(GOAL) + i][width - goal_cols:] = row.split(",")
+
+    spots = [(c, row) for c, row in spots if SAFE_COLS <= c < width - goal_cols]
+    for c, row in rng.sample(spots, min(enemies, len(spots))):
+        grid[row][c] = "x"
+    return [",".join(row) for row in grid]
+
+
+def write_level(rows, path):
+    """Write rows to path.txt and compile them to path.lvl."""
+    with open(path + ".txt", "w") as f:
+        f.write("\n".join(rows) + "\n")
+    save_level(compile_level(rows), path + ".lvl")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate large levels for testing and benchmarks.")
+    parser.add_argument("--width", type=int, default=1000)
+    parser.add_argument("--density", type=float, default=0.8)
+    parser.add_argument("--enemies", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="generated", help="path to write, without the .txt/.lvl extension")
+    parser.add_argument("--corpus", metavar="DIR", help="write every CORPUS level into DIR instead")
+    args = parser.parse_args()
+
+    if args.corpus:
+        os.makedirs(args.corpus, exist_ok=True)
+        for name, params in CORPUS.items():
+            write_level(generate(**params), os.path.join(args.corpus, name))
+            print(f"{name}: {params['width']} columns")
+    else:
+        write_level(generate(args.width, args.density, args.enemies, args.seed), args.out)
+
+
+if __name__ == "__main__":
+    main()
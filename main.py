@@ -1,186 +1,131 @@
+import time
+
+started = time.perf_counter()
+
+import argparse
+import atexit
+import threading
+
 import pygame as pg
 import pygame.sprite
 
-import sprites
+import assets
 from settings import *
-from sprites import Player, Layout, Enemy
-
-pg.init()
+from game import Game
+from hotreload import LevelWatcher
+from inputs import KeyboardInput
+from profiler import profile, StartupTimer
+from replay import Recorder
+from scenes import start_menu, win_menu, gameover_menu
+from timestep import FixedTimestep
+
+parser = argparse.ArgumentParser(description="Platformer Game")
+parser.add_argument("--record", metavar="FILE",
+                    help="record the inputs of this session for replay.py (turns off hot reload)")
+parser.add_argument("--profile", metavar="FILE",
+                    help="start with the frame profiler on and save its buffer to FILE (.csv or .json) on exit")
+parser.add_argument("--startup", action="store_true", help="print how long each startup phase took")
+parser.add_argument("--levels", nargs="+", metavar="FILE",
+                    help="play these level files (text or .lvl) instead of the built in levels")
+args = parser.parse_args()
+startup = StartupTimer(started)
+startup.lap("imports")
+
+# fonts and the mixer start when first used, see assets.LazyFont and assets.LazySound
+pg.display.init()
+startup.lap("display init")
 
 # Set Base Screen
 screen = pg.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
 pg.display.set_caption("Platformer Game")
+startup.lap("window")
 
-floor = sprites.SpriteSheet("images/sheet.png")
+controls = KeyboardInput()
+# the first level is built on the preload thread while the start screen shows
+game = Game(controls, args.levels or LEVELS)
+# a recording only has the inputs, so levels edited mid-run wouldn't replay
+watcher = LevelWatcher(game) if HOT_RELOAD and not args.record else None
+startup.lap("game")
 
-# Groups
-global next
+if args.record:
+    game.recorder = Recorder(game)
+    atexit.register(game.recorder.save, args.record, game)
 
-layout = Layout(LAYOUT, TILE_SIZE, next)
+if args.profile:
+    profile.toggle()
+    atexit.register(profile.export, args.profile)
 
 clock = pg.time.Clock()
+timestep = FixedTimestep()
 
-next = 0
-game_state = -1
-max_level = 1
+menus = {-1: start_menu(game), 1: gameover_menu(game), 2: win_menu(game)}
+startup.lap("menus")
 
-def start():
-    screen = pg.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
-    clock = pg.time.Clock()
-    global game_state
-    global next
-    running = True
-    while running:
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                quit()
-            if event.type == pg.KEYDOWN:
-                if event.key == pg.K_r:
-                    SELECT_SOUND.play()
-                    game_state = 0
-                    running = False
-
-        screen.fill(SKY)
-        text = END.render(f"PRESS", True, BLACK)
-        screen.blit(text, [295, 350])
-        text = END.render(f"'R'", True, BLACK)
-        screen.blit(text, [330, 425])
-        text = END.render(f"TO START", True, BLACK)
-        screen.blit(text, [240, 500])
-
-        pg.display.flip()
-        clock.tick(FPS)
-
-def win():
-    screen = pg.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
-    clock = pg.time.Clock()
-    global game_state
-    global next
-    running = True
-    while running:
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                quit()
-            if event.type == pg.KEYDOWN:
-                if event.key == pg.K_ESCAPE:
-                    SELECT_SOUND.play()
-                    next = 0
-                    game_state = -1
-                    reset_game()
-                    running = False
-
-        screen.fill(SKY)
-        text = END.render(f"YOU WIN!", True, GREEN)
-        screen.blit(text, [240, 400])
-        text = SCORE.render(f"If you wish to reset,", True, WHITE)
-        screen.blit(text, [220, 600])
-        text = SCORE.render(f"press the 'Escape' key", True, WHITE)
-        screen.blit(text, [200, 650])
-
-        pg.display.flip()
-        clock.tick(FPS)
-
-def gameover():
-    screen = pg.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
-    clock = pg.time.Clock()
-    global game_state
-    global next
-    running = True
-    while running:
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                quit()
-            if event.type == pg.KEYDOWN:
-                if event.key == pg.K_r:
-                    SELECT_SOUND.play()
-                    game_state = 0
-                    running = False
-                if event.key == pg.K_ESCAPE:
-                    SELECT_SOUND.play()
-                    next = 0
-                    game_state = -1
-                    reset_game()
-                    running = False
-
-        screen.fill(SKY)
-        text = END.render(f"GAME OVER", True, RED)
-        screen.blit(text, [240, 400])
-        text = SCORE.render(f"If you wish to reset,", True, WHITE)
-        screen.blit(text, [220, 600])
-        text = SCORE.render(f"press the 'Escape' key", True, WHITE)
-        screen.blit(text, [200, 650])
-        text = SCORE.render(f"If you wish to contiune,", True, WHITE)
-        screen.blit(text, [180, 495])
-        text = SCORE.render(f"press the 'r' key", True, WHITE)
-        screen.blit(text, [247, 535])
-
-        pg.display.flip()
-        clock.tick(FPS)
+menus[game.game_state].draw(screen)
+startup.lap("first frame")
+if args.startup:
+    print(startup.report())
+
+# the sounds aren't needed until a key is pressed
+threading.Thread(target=assets.load_all, daemon=True).start()
+
+max_level = 1
 
 def play():
     playing = True
+    timestep.reset()
+    game.layout.repaint()
+    overlay = []
 
     while playing:
 
-        clock.tick(FPS)
-        global game_state
-        global next
+        clock.tick(RENDER_FPS)
+        profile.begin_frame()
 
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 quit()
-            if event.type == pg.KEYDOWN:
-                if event.key == pg.K_q:
-                    next += 1
-                    reset_game()
-
-        screen.fill(SKY)
-
-        layout.draw(screen)
-
-        layout.update()
-
-        if layout.Kill_Player() == False:
-            game_state = 1
-            playing = False
-            reset_game()
-
-        elif layout.Next_Level() == False:
-            next += 1
-            reset_game()
-
-        if next == 3:
-            layout.Cont()
-
-        if game_state == 2:
-            playing = False
-
-        pg.display.flip()
-
-def reset_game():
-    global layout
-    global next
-    layout = Layout(LAYOUT, TILE_SIZE, next)
-    if next == 1:
-        layout = Layout(LAYOUT_2, TILE_SIZE, next)
-    if next == 2:
-        layout = Layout(LAYOUT_3, TILE_SIZE, next)
-    if next == 3:
-        layout = Layout(LAYOUT_4, TILE_SIZE, next)
-    if next == 4:
-        global game_state
-        game_state = 2
+            if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                profile.toggle()
+            controls.handle_event(event)
+        if watcher is not None:
+            watcher.poll()
+        profile.lap("events")
+
+        # the rules advance in fixed steps, drawing blends between the last two
+        for step in range(timestep.advance()):
+            game.step()
+            if game.game_state != 0:
+                playing = False
+                break
+
+        if DIRTY_RENDER:
+            rects = game.layout.draw_dirty(screen, timestep.alpha, overlay)
+            profile.lap("draw")
+            overlay = profile.draw(screen)
+            profile.lap("overlay")
+
+            if rects is None:
+                pg.display.flip()
+            elif rects or overlay:
+                pg.display.update(rects + overlay)
+        else:
+            screen.fill(SKY)
+            game.layout.draw(screen, timestep.alpha)
+            profile.lap("draw")
+            profile.draw(screen)
+            profile.lap("overlay")
+
+            pg.display.flip()
+        profile.lap("flip")
+        profile.end_frame()
 
 
 robert = True
 while robert:
-    if game_state == -1:
-        start()
-    if game_state == 0:
+    if game.game_state == 0:
         play()
-    if game_state == 1:
-        gameover()
-    if game_state == 2:
-        win()
+    else:
+        menus[game.game_state].run(screen)
 
 pg.quit()
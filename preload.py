@@ -0,0 +1,50 @@
+# Background level loading.
+# While a level is played, a worker thread builds the Layouts the game is
+# likely to need next (the following level, and a fresh copy of the current
+# one for when the player dies), chunk surfaces included. Switching level
+# then just takes the finished Layout. Layouts are built the same way on the
+# worker as on the main thread, so runs and replays are unaffected.
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Preloader:
+    """Builds levels with build(level) on one worker thread, keyed by level number."""
+
+    def __init__(self, build):
+        self.build = build
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preload")
+        self.hits = 0
+        self.misses = 0
+
+    def want(self, *levels):
+        """Start building levels that aren't pending yet and drop pending ones not listed."""
+        for level in list(self.pending):
+            if level not in levels:
+                self.pending.pop(level).cancel()
+        for level in levels:
+            if level not in self.pending:
+                self.pending[level] = self.executor.submit(self.build, level)
+
+    def take(self, level):
+        """The built level, waiting for it if it is still being built, or built right here
+        if it was never asked for."""
+        future = self.pending.pop(level, None)
+        if future is None:
+            self.misses += 1
+            return self.build(level)
+        self.hits += 1
+        return future.result()
+
+    def discard(self, level):
+        """Forget a pending build of level, e.g. because its file changed."""
+        future = self.pending.pop(level, None)
+        if future is not None:
+            future.cancel()
+
+    def close(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,156 @@
+# Frame profiler.
+# The main loop and the game rules call profile.lap(stage) after each stage,
+# which adds the time since the previous lap to that stage for the current
+# frame. end_frame() stores the frame in a ring buffer of the last
+# PROFILE_FRAMES frames. F3 in game toggles collection and the overlay; while
+# it is off every call returns straight away.
+
+import csv
+import json
+import time
+from array import array
+
+import pygame as pg
+
+from settings import *
+
+STAGES = ("events", "player", "enemies", "camera", "checks", "draw", "overlay", "flip")
+
+
+def percentile(values, fraction):
+    """values must already be sorted."""
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class FrameProfiler:
+    """Ring buffer of per stage timings, in milliseconds, for the last size frames."""
+
+    def __init__(self, size=PROFILE_FRAMES, stages=STAGES):
+        self.enabled = False
+        self.size = size
+        self.stages = stages
+        self.index = {stage: i for i, stage in enumerate(stages)}
+        self.times = array("d", bytes(8 * size * len(stages)))
+        self.frame = array("d", bytes(8 * len(stages)))
+        self.head = 0
+        self.count = 0
+        self.last = 0.0
+        self.font = None
+        self.text = None
+        self.text_frame = 0
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.reset()
+
+    def reset(self):
+        self.head = 0
+        self.count = 0
+        self.text = None
+        self.begin_frame()
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        for i in range(len(self.frame)):
+            self.frame[i] = 0.0
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.frame[self.index[stage]] += (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        width = len(self.stages)
+        start = self.head * width
+        self.times[start:start + width] = self.frame
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def rows(self):
+        """Buffered frames, oldest first, as lists of stage times."""
+        width = len(self.stages)
+        first = (self.head - self.count) % self.size
+        rows = []
+        for n in range(self.count):
+            start = (first + n) % self.size * width
+            rows.append(self.times[start:start + width].tolist())
+        return rows
+
+    def summary(self):
+        """p50/p99 frame time and the stage with the highest mean over the buffer."""
+        rows = self.rows()
+        totals = sorted(sum(row) for row in rows)
+        means = [sum(column) / len(rows) for column in zip(*rows)] if rows else [0.0] * len(self.stages)
+        slowest = max(range(len(self.stages)), key=means.__getitem__)
+        return {
+            "frames": len(rows),
+            "p50_ms": percentile(totals, 0.5),
+            "p99_ms": percentile(totals, 0.99),
+            "slowest": self.stages[slowest],
+            "slowest_ms": means[slowest],
+        }
+
+    def draw(self, display):
+        """Overlay in the top left corner, re-rendered every PROFILE_REFRESH frames.
+
+        Returns the screen rects it covered.
+        """
+        if not self.enabled:
+            return []
+        self.text_frame += 1
+        if self.text is None or self.text_frame >= PROFILE_REFRESH:
+            if self.font is None:
+                self.font = pg.font.Font("images/unifont.ttf", 16)
+            stats = self.summary()
+            lines = [f"frame p50 {stats['p50_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms",
+                     f"slowest {stats['slowest']} {stats['slowest_ms']:.2f} ms"]
+            self.text = [self.font.render(line, True, WHITE, BLACK) for line in lines]
+            self.text_frame = 0
+        return [display.blit(surface, (5, 5 + i * 18)) for i, surface in enumerate(self.text)]
+
+    def export_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("frame",) + self.stages + ("total",))
+            for n, row in enumerate(self.rows()):
+                writer.writerow([n] + [f"{value:.4f}" for value in row] + [f"{sum(row):.4f}"])
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"stages": self.stages, "summary": self.summary(), "frames": self.rows()}, f)
+
+    def export(self, path):
+        """CSV or JSON depending on the file extension."""
+        if path.endswith(".json"):
+            self.export_json(path)
+        else:
+            self.export_csv(path)
+
+
+class StartupTimer:
+    """Time to the first frame, split into the phases named by lap()."""
+
+    def __init__(self, start=None):
+        self.start = self.last = start if start is not None else time.perf_counter()
+        self.phases = []
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def report(self):
+        lines = [f"{phase:<12} {ms:8.1f} ms" for phase, ms in self.phases]
+        lines.append(f"{'total':<12} {(self.last - self.start) * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+profile = FrameProfiler()
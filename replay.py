@@ -0,0 +1,241 @@
+# Input recording and replay.
+# A recording is the KeyState polled by every Game.step(), run-length encoded,
+# plus markers for restarts from the menus and a checksum of the game state
+# every CHECK_INTERVAL steps. The rules run on a fixed timestep with a
+# simulated clock, so feeding the same inputs back through Game.step()
+# reproduces the run exactly, deaths and level changes included:
+#
+#     python main.py --record run.rpl
+#     python replay.py run.rpl            # headless, as fast as possible
+#     python replay.py run.rpl --render   # in a window at SIM_HZ
+#
+# A run recorded with main.py --levels replays with the same --levels.
+
+import os
+import sys
+
+if __name__ == "__main__" and "--render" not in sys.argv:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+import argparse
+import hashlib
+import struct
+import time
+import zlib
+
+import pygame as pg
+
+from settings import *
+from game import Game
+from inputs import KeyState
+
+MAGIC = b"RPL1"
+HEADER = struct.Struct("<4sHHI16s")
+CHECK = struct.Struct("<II")
+
+# Records. Input runs are one byte of key bits followed by a run length byte.
+LEFT = 1
+RIGHT = 2
+JUMP = 4
+SKIP = 8
+RESTART = 0x80
+CHECKSUM = 0x81
+
+CHECK_INTERVAL = 600
+
+
+def encode_keys(keys):
+    return (LEFT if keys.left else 0) | (RIGHT if keys.right else 0) | \
+           (JUMP if keys.jump else 0) | (SKIP if keys.skip else 0)
+
+
+def decode_keys(bits):
+    return KeyState(bool(bits & LEFT), bool(bits & RIGHT), bool(bits & JUMP), bool(bits & SKIP))
+
+
+def levels_digest(levels):
+    """Fingerprint of the level data, so replaying against edited levels is caught."""
+    digest = hashlib.md5()
+    for level in levels:
+        if isinstance(level, str):
+            with open(level, "rb") as f:
+                digest.update(f.read())
+        else:
+            digest.update("\n".join(level).encode())
+        digest.update(b"\0")
+    return digest.digest()
+
+
+def state_checksum(game):
+    layout = game.layout
+    player = layout.player_group.sprites()[0] if layout.player_group else None
+    state = (game.next, game.frames, layout.view.x,
+             tuple(player.rect) if player else None, player.change_y if player else None,
+             sorted(layout.enemy_rects()))
+    return zlib.crc32(repr(state).encode())
+
+
+class Recorder:
+    """Collects the inputs of a Game as it is played. Attach with game.recorder = Recorder(game)."""
+
+    def __init__(self, game):
+        self.data = bytearray(HEADER.pack(MAGIC, 1, SIM_HZ, game.next, levels_digest(game.levels)))
+        self.bits = None
+        self.run = 0
+        self.steps = 0
+
+    def record(self, keys, game):
+        """Called by Game.step() after the step has run."""
+        bits = encode_keys(keys)
+        if bits != self.bits or self.run == 255:
+            self.flush()
+            self.bits = bits
+        self.run += 1
+        self.steps += 1
+        if self.steps % CHECK_INTERVAL == 0:
+            self.checksum(game)
+
+    def restart(self):
+        self.flush()
+        self.data.append(RESTART)
+
+    def checksum(self, game):
+        self.flush()
+        self.data.append(CHECKSUM)
+        self.data += CHECK.pack(self.steps, state_checksum(game))
+
+    def flush(self):
+        if self.run:
+            self.data.append(self.bits)
+            self.data.append(self.run)
+        self.bits = None
+        self.run = 0
+
+    def save(self, path, game=None):
+        if game is not None:
+            self.checksum(game)
+        self.flush()
+        with open(path, "wb") as f:
+            f.write(self.data)
+
+
+def read_records(data):
+    """Yield ("keys", bits, count), ("restart",) and ("check", steps, crc) records."""
+    pos = HEADER.size
+    while pos < len(data):
+        kind = data[pos]
+        if kind == RESTART:
+            yield ("restart",)
+            pos += 1
+        elif kind == CHECKSUM:
+            yield ("check",) + CHECK.unpack_from(data, pos + 1)
+            pos += 1 + CHECK.size
+        else:
+            yield ("keys", kind, data[pos + 1])
+            pos += 2
+
+
+class ReplayInput:
+    """Input provider that returns whatever the replay loop put in state."""
+
+    def __init__(self):
+        self.state = decode_keys(0)
+
+    def poll(self):
+        return self.state
+
+
+def load(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, sim_hz, level, digest = HEADER.unpack_from(data)
+    if magic != MAGIC or version != 1:
+        raise ValueError(f"Not a replay file: {path}")
+    return data, sim_hz, level, digest
+
+
+def replay(path, levels=None, render=None, step_times=None):
+    """Play a recording back through a Game.
+
+    render is an optional callable run after every step (for drawing).
+    step_times, if given, is a list each step's duration in seconds is appended to.
+    Returns the Game and a dict with the step count and any checksum mismatches.
+    """
+    data, sim_hz, level, digest = load(path)
+    levels = levels if levels is not None else LEVELS
+    if sim_hz != SIM_HZ:
+        print(f"warning: recorded at {sim_hz} Hz, replaying at {SIM_HZ} Hz", file=sys.stderr)
+    if digest != levels_digest(levels):
+        print("warning: the levels have changed since this was recorded (or it was recorded with --levels)",
+              file=sys.stderr)
+
+    controls = ReplayInput()
+    game = Game(controls, levels, level)
+    game.game_state = 0
+    mismatches = []
+    clock = time.perf_counter
+
+    for record in read_records(data):
+        if record[0] == "keys":
+            controls.state = decode_keys(record[1])
+            for _ in range(record[2]):
+                start = clock()
+                game.step()
+                if step_times is not None:
+                    step_times.append(clock() - start)
+                if render is not None:
+                    render(game)
+        elif record[0] == "restart":
+            game.restart()
+        elif record[0] == "check":
+            if state_checksum(game) != record[2]:
+                mismatches.append(record[1])
+
+    return game, {"steps": game.frames, "mismatches": mismatches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded run.")
+    parser.add_argument("path")
+    parser.add_argument("--render", action="store_true", help="draw in a window at SIM_HZ")
+    parser.add_argument("--slowest", type=int, default=5, help="report the N slowest steps")
+    parser.add_argument("--levels", nargs="+", metavar="FILE",
+                        help="the level files the run was recorded with (main.py --levels)")
+    args = parser.parse_args()
+
+    pg.init()
+    screen = pg.display.set_mode((WIN_WIDTH, WIN_HEIGHT) if args.render else (1, 1))
+    clock = pg.time.Clock()
+
+    def render(game):
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                raise SystemExit
+        screen.fill(SKY)
+        game.layout.draw(screen)
+        pg.display.flip()
+        clock.tick(SIM_HZ)
+
+    step_times = []
+    start = time.perf_counter()
+    game, stats = replay(args.path, args.levels, render=render if args.render else None, step_times=step_times)
+    elapsed = time.perf_counter() - start
+
+    steps = stats["steps"]
+    print(f"{steps} steps in {elapsed:.3f}s ({steps / elapsed if elapsed else 0:.0f} steps/s), "
+          f"ended on level {game.next}")
+    if step_times:
+        ordered = sorted(step_times)
+        print(f"step time p50 {ordered[len(ordered) // 2] * 1000:.3f} ms, "
+              f"p99 {ordered[int(len(ordered) * 0.99)] * 1000:.3f} ms, max {ordered[-1] * 1000:.3f} ms")
+        slowest = sorted(range(len(step_times)), key=step_times.__getitem__, reverse=True)[:args.slowest]
+        print("slowest steps: " + ", ".join(f"#{i} {step_times[i] * 1000:.3f} ms" for i in slowest))
+    if stats["mismatches"]:
+        print(f"DESYNC: state differs from the recording at steps {stats['mismatches']}")
+        raise SystemExit(1)
+    print("state matches the recording")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Menu screens.
+# Nothing on a menu moves, so a Menu renders its text once when it is made,
+# draws and flips once when shown, then sleeps in pygame.event.wait() until
+# one of its keys is pressed. It only redraws if the window asks to be
+# repainted.
+
+import pygame as pg
+
+from settings import *
+
+REDRAW_EVENTS = {pg.VIDEOEXPOSE, pg.WINDOWEXPOSED, pg.WINDOWRESTORED, pg.WINDOWSIZECHANGED}
+
+
+class Menu:
+    """lines are (font, text, color, position) tuples, actions maps keys to functions."""
+
+    def __init__(self, lines, actions, background=SKY):
+        self.lines = [(font.render(text, True, color), position) for font, text, color, position in lines]
+        self.actions = actions
+        self.background = background
+
+    def draw(self, screen):
+        screen.fill(self.background)
+        for surface, position in self.lines:
+            screen.blit(surface, position)
+        pg.display.flip()
+
+    def run(self, screen):
+        """Show the menu until one of its keys is pressed, then run that key's action."""
+        self.draw(screen)
+        while True:
+            event = pg.event.wait()
+            if event.type == pg.QUIT:
+                quit()
+            elif event.type in REDRAW_EVENTS:
+                self.draw(screen)
+            elif event.type == pg.KEYDOWN and event.key in self.actions:
+                SELECT_SOUND.play()
+                self.actions[event.key]()
+                return
+
+
+def start_menu(game):
+    def play():
+        game.game_state = 0
+
+    return Menu([(END, "PRESS", BLACK, [295, 350]),
+                 (END, "'R'", BLACK, [330, 425]),
+                 (END, "TO START", BLACK, [240, 500])],
+                {pg.K_r: play})
+
+
+def win_menu(game):
+    return Menu([(END, "YOU WIN!", GREEN, [240, 400]),
+                 (SCORE, "If you wish to reset,", WHITE, [220, 600]),
+                 (SCORE, "press the 'Escape' key", WHITE, [200, 650])],
+                {pg.K_ESCAPE: game.restart})
+
+
+def gameover_menu(game):
+    def play():
+        game.game_state = 0
+
+    return Menu([(END, "GAME OVER", RED, [240, 400]),
+                 (SCORE, "If you wish to reset,", WHITE, [220, 600]),
+                 (SCORE, "press the 'Escape' key", WHITE, [200, 650]),
+                 (SCORE, "If you wish to contiune,", WHITE, [180, 495]),
+                 (SCORE, "press the 'r' key", WHITE, [247, 535])],
+                {pg.K_r: play, pg.K_ESCAPE: game.restart})
@@ -1,5 +1,6 @@
 import pygame as pg
 # from sprites import SpriteSheet
+from assets import LazyFont, LazySound
 
 # Constants
 BLACK = (0, 0, 0)
@@ -11,10 +12,57 @@ SKY = (9, 175, 236)
 
 FPS = 60
 
+# The game rules run in fixed steps of 1 / SIM_HZ seconds. Speeds are whole
+# or half pixels per step and positions are whole pixels, rounded every step,
+# so the rules are tuned for SIM_HZ = 60: changing it changes how the game
+# plays, not just how often it is stepped. RENDER_FPS
+# caps how often gameplay is drawn (0 for no cap), and a slow frame runs at
+# most MAX_STEPS_PER_FRAME steps before dropping the backlog.
+SIM_HZ = 60
+RENDER_FPS = 60
+MAX_STEPS_PER_FRAME = 5
+
 WIN_WIDTH = 825
 WIN_HEIGHT = 825
 TILE_SIZE = 75
 
+# Static tiles are pre-rendered into chunks of CHUNK_COLS x CHUNK_ROWS tiles,
+# keeping at most CHUNK_CACHE_SIZE chunks per layer
+CHUNK_RENDER = True
+CHUNK_COLS = 16
+CHUNK_ROWS = 11
+CHUNK_CACHE_SIZE = 6
+
+# Levels wider than STREAM_MIN_COLS columns are only built STREAM_CHUNKS
+# column chunks either side of the camera
+STREAM_MIN_COLS = 256
+STREAM_CHUNKS = 1
+
+# While the camera is still, only redraw and update the screen around sprites
+# that moved, the whole screen is redrawn whenever it scrolls
+DIRTY_RENDER = True
+
+# Step enemies together as NumPy arrays (swarm.py) instead of one sprite
+# each, for levels with thousands of them. Needs numpy.
+SWARM = False
+
+# Build the Layouts for the next level and for respawning on a background
+# thread while a level is played (preload.py), starting PRELOAD_DELAY frames
+# into the level
+PRELOAD = True
+PRELOAD_DELAY = 30
+
+# Levels loaded from files are checked for changes every HOT_RELOAD_INTERVAL
+# frames while playing and edits are patched into the running level
+# (hotreload.py)
+HOT_RELOAD = True
+HOT_RELOAD_INTERVAL = 30
+
+# The frame profiler (F3) keeps the last PROFILE_FRAMES frames and redraws
+# its overlay every PROFILE_REFRESH frames
+PROFILE_FRAMES = 600
+PROFILE_REFRESH = 15
+
 # A
 
 width = 20
@@ -26,14 +74,20 @@ player_y_pad = 0
 
 # Font
 
-pg.font.init()
-END = pg.font.Font('images/unifont.ttf', 80)
-SCORE = pg.font.Font('images/unifont.ttf', 40)
+# loaded on first use, see assets.LazyFont and assets.LazySound
+END = LazyFont('images/unifont.ttf', 80)
+SCORE = LazyFont('images/unifont.ttf', 40)
+
+JUMP_SOUND = LazySound("images/Jump.wav")
+SELECT_SOUND = LazySound("images/Blip_Select.wav")
+LEVEL_SOUND = LazySound("images/Pickup_Coin.wav")
 
-pg.mixer.init()
-JUMP_SOUND = pg.mixer.Sound("images/Jump.wav")
-SELECT_SOUND = pg.mixer.Sound("images/Blip_Select.wav")
-LEVEL_SOUND = pg.mixer.Sound("images/Pickup_Coin.wav")
+# Enemy spawners, keyed by level number. points are screen positions,
+# interval is the number of frames between spawns and limit caps how many
+# enemies can be alive at once.
+SPAWNERS = {
+    3: {"points": [(800, 720)], "interval": 1, "limit": 4},
+}
 
 LAYOUT = [
     '0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0',
@@ -89,4 +143,8 @@ LAYOUT_4 = [
     '0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,y,=,=',
     'p,0,0,0,x,x,0,0,x,x,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,7,=,=,=',
     'a,0,L,2,2,2,2,2,2,2,R,0,L,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2',
-]
\ No newline at end of file
+]
+
+# Levels played in order. Entries can also be paths to level files, either
+# text (one comma separated row per line) or compiled .lvl files.
+LEVELS = [LAYOUT, LAYOUT_2, LAYOUT_3, LAYOUT_4]
@@ -1,113 +1,55 @@
-# This class handles sprite sheets
-# https://www.pygame.org/wiki/Spritesheet
-# I've added some code to fail if the file wasn't found..
-# Note: When calling images_at the rect is the format:
-# (x, y, x + offset, y + offset)
-
 from settings import *
 
-import pygame
-
+import sys
 
-class SpriteSheet:
-
-    def __init__(self, filename):
-        """Load the sheet."""
-        try:
-            self.sheet = pygame.image.load(filename).convert()
-        except pygame.error as e:
-            print(f"Unable to load spritesheet image: {filename}")
-            raise SystemExit(e)
-
-    def image_at(self, rectangle, colorkey=None):
-        """Load a specific image from a specific rectangle."""
-        """rectangle is a tuple with (x, y, x+offset, y+offset)"""
-        rect = pygame.Rect(rectangle)
-        image = pygame.Surface(rect.size).convert()
-        image.blit(self.sheet, (0, 0), rect)
-        if colorkey is not None:
-            if colorkey is -1:
-                colorkey = image.get_at((0, 0))
-            image.set_colorkey(colorkey, pygame.RLEACCEL)
-        return image
-
-    def images_at(self, rects, colorkey=None):
-        """Load a whole bunch of images and return them as a list."""
-        return [self.image_at(rect, colorkey) for rect in rects]
-
-    def load_strip(self, rect, image_count, colorkey=None):
-        """Load a whole strip of images, and return them as a list."""
-        tups = [(rect[0] + rect[2] * x, rect[1], rect[2], rect[3])
-                for x in range(image_count)]
-        return self.images_at(tups, colorkey)
-
-    def load_grid_images(self, num_rows, num_cols, x_margin=0, x_padding=0,
-                         y_margin=0, y_padding=0, width=None, height=None, colorkey=None):
-        """Load a grid of images.
-        x_margin is the space between the top of the sheet and top of the first
-        row. x_padding is space between rows. Assumes symmetrical padding on
-        left and right.  Same reasoning for y. Calls self.images_at() to get a
-        list of images.
-        """
+import pygame
 
-        sheet_rect = self.sheet.get_rect()
-        sheet_width, sheet_height = sheet_rect.size
+import assets
+from animation import AnimationClock, PLAYER_WALK, ENEMY_WALK
+from assets import SpriteSheet
+from camera import Camera
+from profiler import profile
+from timestep import SimClock
+from chunks import ChunkCache
+from collision import SweepAndPrune, TileGrid
+from inputs import IDLE, read_keyboard
+from level import Level, compile_cached, open_level, tile_images, CODES, LAYERS, SOLID, GOAL, PLAYER, ENEMY
 
-        # To calculate the size of each sprite, subtract the two margins,
-        #   and the padding between each row, then divide by num_cols.
-        # Same reasoning for y.
+try:
+    from swarm import Swarm
+except ImportError:  # numpy is optional
+    Swarm = None
 
-        if width and height:
-            x_sprite_size = width
-            y_sprite_size = height
-        else:
-            x_sprite_size = (sheet_width - 2 * x_margin
-                             - (num_cols - 1) * x_padding) / num_cols
-            y_sprite_size = (sheet_height - 2 * y_margin
-                             - (num_rows - 1) * y_padding) / num_rows
-
-        sprite_rects = []
-        for row_num in range(num_rows):
-            for col_num in range(num_cols):
-                # Position of sprite rect is margin + one sprite size
-                #   and one padding size for each row. Same for y.
-                x = x_margin + col_num * (x_sprite_size + x_padding)
-                y = y_margin + row_num * (y_sprite_size + y_padding)
-                sprite_rect = (x, y, x_sprite_size, y_sprite_size)
-                sprite_rects.append(sprite_rect)
-
-        return self.images_at(sprite_rects, colorkey)
 
 class Player(pygame.sprite.Sprite):
 
-    def __init__(self, image_path, tilelist, level):
+    def __init__(self, frames, tile_grid, level, view, animations):
         pygame.sprite.Sprite.__init__(self)
 
-        self.run_rt_list = image_path
-        self.run_lft_list = [pg.transform.flip(characters, True, False) for characters in image_path]
+        # frames is an assets.FrameSet, shared with every other sprite using the same frames
+        self.run_rt_list = frames.right
+        self.run_lft_list = frames.left
         self.image = self.run_rt_list[0]
         self.rect = self.image.get_rect()
         self.rect.x = self.rect.width + 250
         self.rect.y = WIN_HEIGHT - 300  # - 75*2 - 26
         self.next = level
 
-        self.tile_list = tilelist
-
-        self.prev_update = pygame.time.get_ticks()
-        self.frame = 0
-        self.framerate = 100
+        self.tile_grid = tile_grid
+        self.view = view
+        self.animations = animations
 
-        self.prev_update_jump = pygame.time.get_ticks()
+        self.prev_update_jump = animations.clock.now
         self.time = 1000
 
         self.change_x = 0
         self.jumping = False
         self.falling = False
-        self.change_y = 1
+        self.change_y = 1.0
         self.counter = 0
         self.change_counter = 0
 
-    def update(self):
+    def update(self, keys):
         self.rect.x += self.change_x
         self.rect.y += self.change_y
 
@@ -115,35 +57,27 @@ class Player(pygame.sprite.Sprite):
             self.change_y = 3.5
             self.falling = True
 
-        now = pygame.time.get_ticks()
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_RIGHT]:
-            if self.rect.x <= WIN_WIDTH:
-                self.change_x = 2
-
-                if now - self.prev_update > self.framerate:
-                    self.prev_update = now
-                    self.frame += 1
-                    self.image = self.run_rt_list[self.frame]
-                if self.frame == 4:
-                    self.frame = 0
-
-
-        elif keys[pygame.K_LEFT]:
-            if self.rect.x >= 0:
-                self.change_x = -2
-
-                if now - self.prev_update > self.framerate:
-                    self.prev_update = now
-                    self.frame += 1
-                    self.image = self.run_lft_list[self.frame]
-                if self.frame == 4:
-                    self.frame = 0
+        # the walk frames are set by the layout's AnimationClock while walking
+        screen_x = self.view.to_screen(self.rect.x)
+        if keys.right:
+            if screen_x <= WIN_WIDTH:
+                self.change_x = 2.0
+                self.animations.play(self, PLAYER_WALK, self.run_rt_list)
+            else:
+                self.animations.stop(self)
+
+        elif keys.left:
+            if screen_x >= 0:
+                self.change_x = -2.0
+                self.animations.play(self, PLAYER_WALK, self.run_lft_list)
+            else:
+                self.animations.stop(self)
 
         else:
             self.change_x = 0
+            self.animations.stop(self)
 
-        for tile in self.tile_list:
+        for tile in self.tile_grid.query_move(self.rect, self.change_x, self.change_y):
             # see if any tile rect collides with player rect in horiz direction, notice the addition of dx to rect.x
             if tile[1].colliderect(self.rect.x + self.change_x,
                                    self.rect.y,
@@ -170,42 +104,55 @@ class Player(pygame.sprite.Sprite):
                     self.jumping = False
                     self.falling = False
 
-        if keys[pygame.K_SPACE] and not self.jumping and not self.falling:
+        if keys.jump and not self.jumping and not self.falling:
             self.jumping = True
             if self.next != 2:
                 JUMP_SOUND.play()
-            self.change_y = -3
+            self.change_y = -3.0
             self.change_counter = 1.5
 
         self.counter += self.change_counter
         if self.counter > 50:
             self.jumping = False
-            self.change_y = 1
+            self.change_y = 1.0
             self.counter = 0
             self.change_counter = 0
 
 class Enemy(pygame.sprite.Sprite):
-    def __init__(self, image_path, tile_list):
+    def __init__(self, frames, tile_grid, view, animations, pool=None):
         pygame.sprite.Sprite.__init__(self)
 
-        self.run_rt_list = image_path
-        self.run_lft_list = [pg.transform.flip(characters, True, False) for characters in image_path]
+        self.run_rt_list = frames.right
+        self.run_lft_list = frames.left
         self.image = self.run_rt_list[0]
         self.rect = self.image.get_rect()
-        self.rect.x = self.rect.width + 250
-        self.rect.y = WIN_HEIGHT - 300  # - 75*2 - 26
 
-        self.tile_list = tile_list
+        self.tile_grid = tile_grid
+        self.view = view
+        self.animations = animations
+        self.pool = pool
 
-        self.prev_update = pygame.time.get_ticks()
-        self.frame = 0
-        self.framerate = 100
+        self.reset(self.rect.width + 250, WIN_HEIGHT - 300)  # - 75*2 - 26
+
+    def reset(self, x, y):
+        """Put the enemy back into its spawn state at (x, y), used when recycling from a pool."""
+        self.image = self.run_rt_list[0]
+        self.rect.x = x
+        self.rect.y = y
+        self.animations.play(self, ENEMY_WALK, self.run_lft_list)
 
         self.change_x = 0
-        self.change_y = 1
+        self.change_y = 1.0
         self.falling = True
         self.jumping = False
 
+    def kill(self):
+        was_alive = self.alive()
+        pygame.sprite.Sprite.kill(self)
+        self.animations.stop(self)
+        if was_alive and self.pool is not None:
+            self.pool.release(self)
+
     def update(self):
         self.rect.x += self.change_x
         self.rect.y += self.change_y
@@ -214,20 +161,13 @@ class Enemy(pygame.sprite.Sprite):
             self.change_y = 3.5
             self.falling = True
 
-        now = pygame.time.get_ticks()
-
-        self.change_x = -.5
-        if now - self.prev_update > self.framerate:
-            self.prev_update = now
-            self.frame += 1
-            self.image = self.run_lft_list[self.frame]
-        if self.frame == 3:
-            self.frame = 0
+        self.change_x = -0.5
 
-        if self.rect.x <= 0 or self.rect.x >= WIN_WIDTH:
+        screen_x = self.view.to_screen(self.rect.x)
+        if screen_x <= 0 or screen_x >= WIN_WIDTH:
             self.change_x = 0
 
-        for tile in self.tile_list:
+        for tile in self.tile_grid.query_move(self.rect, self.change_x, self.change_y):
             # see if any tile rect collides with player rect in horiz direction, notice the addition of dx to rect.x
             if tile[1].colliderect(self.rect.x + self.change_x,
                                    self.rect.y,
@@ -254,403 +194,462 @@ class Enemy(pygame.sprite.Sprite):
                     self.jumping = False
                     self.falling = False
 
-        if self.rect.y > WIN_HEIGHT + 75 or self.rect.x < 0:
+        if self.rect.y > WIN_HEIGHT + 75 or self.view.to_screen(self.rect.x) < 0:
             self.kill()
 
+class EnemyPool:
+    """Recycles Enemy instances so spawning doesn't rebuild their frame lists."""
+
+    def __init__(self, frames, tile_grid, view, animations):
+        self.frames = frames
+        self.tile_grid = tile_grid
+        self.view = view
+        self.animations = animations
+        self.free = []
+        self.created = 0
+
+    def acquire(self, x, y):
+        if self.free:
+            enemy = self.free.pop()
+            enemy.reset(x, y)
+        else:
+            enemy = Enemy(self.frames, self.tile_grid, self.view, self.animations, self)
+            enemy.reset(x, y)
+            self.created += 1
+        return enemy
+
+    def release(self, enemy):
+        self.free.append(enemy)
+
+
+class Spawner:
+    """Spawns pooled enemies into a group at fixed points.
+
+    points are screen positions and are cycled through in order, one enemy
+    every interval frames, as long as the group holds fewer than
+    limit enemies. group can also be a swarm.Swarm, with no pool.
+    """
+
+    def __init__(self, pool, group, view, points, interval=1, limit=4):
+        self.pool = pool
+        self.view = view
+        self.group = group
+        self.points = points
+        self.interval = max(1, interval)
+        self.limit = limit
+        self.timer = 0
+        self.index = 0
+
+    def update(self):
+        """Spawn the next enemy if it's time. Returns the Enemy spawned from the pool, if any."""
+        self.timer += 1
+        if self.timer < self.interval or len(self.group) >= self.limit:
+            return None
+
+        self.timer = 0
+        x, y = self.points[self.index % len(self.points)]
+        self.index += 1
+        if self.pool is None:
+            self.group.spawn(self.view.to_world(x), y)
+            return None
+        enemy = self.pool.acquire(self.view.to_world(x), y)
+        self.group.add(enemy)
+        return enemy
+
+
+def entity_size(sprite):
+    """Bytes of a sprite's own state: the object, its attribute dict, its rect and float attributes.
+    Frames and other shared objects aren't counted."""
+    state = vars(sprite)
+    return (sys.getsizeof(sprite) + sys.getsizeof(state) + sys.getsizeof(sprite.rect) +
+            sum(sys.getsizeof(value) for value in state.values() if isinstance(value, float)))
+
+
 class Layout:
     def __init__(self, level_layout, tile_size, level):
-        self.tile_list = []
-        self.back_list = []
-        self.end_list = []
+        self.tile_size = tile_size
         self.player_group = pygame.sprite.Group()
         self.enemy_group = pygame.sprite.Group()
-        self.change_x = 0
+        self.enemy_phase = SweepAndPrune()
+        self.view = Camera()
+        self.clock = SimClock()
+        self.animations = AnimationClock(self.clock)
+        self.prev_view_x = 0
+        self.prev_positions = {}
         self.player = None
         self.next = level
+        self.spawner = None
+        self.keys = IDLE
+        self.drawn_offset = None
+        self.drawn = {}
+
+        # Sheets are sliced and scaled once per process, see assets.AssetCache
+        self.player_frames = assets.cache.frames("images/characters.png", 1, 23, player_x, player_x_pad, player_y,
+                                                 player_y_pad, width, height, -1)
+        self.enemy_frames = assets.cache.frames("images/characters.png", 1, 23, player_x, player_x_pad, 101,
+                                                player_y_pad, width, height, -1)
+
+        if isinstance(level_layout, str):
+            level_layout = open_level(level_layout)
+        elif not isinstance(level_layout, Level):
+            level_layout = compile_cached(level_layout)
+        self.level = level_layout
+        self.images = tile_images(tile_size)
+
+        # Wide levels are only materialised around the camera, a CHUNK_COLS wide
+        # column chunk at a time. Enemies are spawned the first time their chunk loads.
+        self.streaming = self.level.width > STREAM_MIN_COLS
+
+        # one byte per cell holding the level code of its tile, which indexes self.images,
+        # kept per loaded chunk when streaming
+        block_cols = CHUNK_COLS if self.streaming else None
+        self.tile_grid = TileGrid(tile_size, self.level.width, self.level.height, self.images, block_cols)
+        self.back_grid = TileGrid(tile_size, self.level.width, self.level.height, self.images, block_cols)
+        self.end_grid = TileGrid(tile_size, self.level.width, self.level.height, self.images, block_cols)
+
+        # tiles and background never change, so they are drawn from pre-rendered chunks
+        self.chunks = ChunkCache((self.tile_grid, self.back_grid), tile_size)
+
+        # with SWARM, enemies are stepped together as arrays instead of Enemy sprites
+        self.swarm = None
+        if SWARM and Swarm is not None:
+            self.swarm = Swarm(self.enemy_frames, tile_size, self.level, self.view, self.animations)
+
+        self.loaded = set()
+        self.spawned = set()
+        # chunk -> (col, row) of enemies added by reload_level() while it was streamed out
+        self.pending = {}
+        if self.streaming:
+            found = self.level.find(CODES["p"])
+            if found is not None:
+                self.load_chunk(found[0] // CHUNK_COLS)
+            self.stream()
+        else:
+            self.load_columns(0, self.level.width)
+
+        if self.next in SPAWNERS:
+            if self.swarm is not None:
+                self.spawner = Spawner(None, self.swarm, self.view, **SPAWNERS[self.next])
+            else:
+                pool = EnemyPool(self.enemy_frames, self.tile_grid, self.view, self.animations)
+                self.spawner = Spawner(pool, self.enemy_group, self.view, **SPAWNERS[self.next])
+
+    @property
+    def tile_list(self):
+        return self.tile_grid.tiles()
+
+    @property
+    def back_list(self):
+        return self.back_grid.tiles()
+
+    @property
+    def end_list(self):
+        return self.end_grid.tiles()
+
+    def load_columns(self, col_start, col_end, spawn=True):
+        """Create the tiles (and with spawn, the player and enemies) for a range of columns."""
+        tile_size = self.tile_size
+        cells = self.level.cells
+        rows = self.level.height
+        col_end = min(col_end, self.level.width)
+        if self.swarm is not None:
+            self.swarm.load_columns(col_start, col_end)
+
+        # one legend lookup per cell, see level.LEGEND
+        for row in range(rows):
+            y_val = row * tile_size
+            for col in range(col_start, col_end):
+                code = cells[col * rows + row]
+                if not code:
+                    continue
+                layer = LAYERS[code]
+                x_val = col * tile_size
+
+                if layer == PLAYER:
+                    if spawn and not self.player_group:
+                        player = Player(self.player_frames, self.tile_grid, self.next, self.view, self.animations)
+                        player.rect.x = x_val
+                        player.rect.y = y_val
+                        self.player_group.add(player)
+                elif layer == ENEMY:
+                    if spawn:
+                        self.spawn_enemy(x_val, y_val)
+                elif layer == SOLID:
+                    self.tile_grid.put(col, row, code)
+                else:
+                    self.back_grid.put(col, row, code)
+                    if layer == GOAL:
+                        self.end_grid.put(col, row, code)
+
+    def spawn_enemy(self, x, y):
+        if self.swarm is not None:
+            self.swarm.spawn(x, y)
+        else:
+            enemy = Enemy(self.enemy_frames, self.tile_grid, self.view, self.animations)
+            enemy.rect.x = x
+            enemy.rect.y = y
+            self.enemy_group.add(enemy)
 
-        characters = SpriteSheet("images/characters.png")
-        run_rt_list = characters.load_grid_images(1, 23, player_x, player_x_pad, player_y, player_y_pad, width, height,
-                                                  -1)
-        run_enemy_list = characters.load_grid_images(1, 23, player_x, player_x_pad, 101, player_y_pad, width, height,
-                                                  -1)
-
-        tile_sheet = SpriteSheet("images/sheet.png")
-        rock_green1 = tile_sheet.image_at((112, 0, 16, 16), (255, 255, 255))
-        rock_green1 = pg.transform.scale(rock_green1, (tile_size, tile_size))
-        rock_green2 = tile_sheet.image_at((112 + 16, 0, 16, 16), (255, 255, 255))
-        rock_green2 = pg.transform.scale(rock_green2, (tile_size, tile_size))
-        rock_green3 = tile_sheet.image_at((112 + 16 * 2, 0, 16, 16), (255, 255, 255))
-        rock_green3 = pg.transform.scale(rock_green3, (tile_size, tile_size))
-        rock_green_left = tile_sheet.image_at((112 + 16, 16, 16, 16), (255, 255, 255))
-        rock_green_left = pg.transform.scale(rock_green_left, (tile_size, tile_size))
-        rock_green_right = tile_sheet.image_at((112 + 16 * 2, 16, 16, 16), (255, 255, 255))
-        rock_green_right = pg.transform.scale(rock_green_right, (tile_size, tile_size))
-        grey_rock_green1 = tile_sheet.image_at((112, 16 * 2, 16, 16), (255, 255, 255))
-        grey_rock_green1 = pg.transform.scale(grey_rock_green1, (tile_size, tile_size))
-        grey_rock_green2 = tile_sheet.image_at((112 + 16, 16 * 2, 16, 16), (255, 255, 255))
-        grey_rock_green2 = pg.transform.scale(grey_rock_green2, (tile_size, tile_size))
-        grey_rock_green3 = tile_sheet.image_at((112 + 16 * 2, 16 * 2, 16, 16), (255, 255, 255))
-        grey_rock_green3 = pg.transform.scale(grey_rock_green3, (tile_size, tile_size))
-        grey_rock_green_left = tile_sheet.image_at((112 + 16, 16 * 3, 16, 16), (255, 255, 255))
-        grey_rock_green_left = pg.transform.scale(grey_rock_green_left, (tile_size, tile_size))
-        grey_rock_green_right = tile_sheet.image_at((112 + 16 * 2, 16 * 3, 16, 16), (255, 255, 255))
-        grey_rock_green_right = pg.transform.scale(grey_rock_green_right, (tile_size, tile_size))
-        rocky = tile_sheet.image_at((112, 16, 16, 16), (255, 255, 255))
-        rocky = pg.transform.scale(rocky, (tile_size, tile_size))
-        grey_rocky = tile_sheet.image_at((112, 16 * 3, 16, 16), (255, 255, 255))
-        grey_rocky = pg.transform.scale(grey_rocky, (tile_size, tile_size))
-        rock_lwall = tile_sheet.image_at((112 + 16 * 3, 16, 16, 16), (255, 255, 255))
-        rock_lwall = pg.transform.scale(rock_lwall, (tile_size, tile_size))
-        rock_rwall = tile_sheet.image_at((112 + 16 * 5, 16, 16, 16), (255, 255, 255))
-        rock_rwall = pg.transform.scale(rock_rwall, (tile_size, tile_size))
-        rock_left = tile_sheet.image_at((112 + 16 * 3, 0, 16, 16), (255, 255, 255))
-        rock_left = pg.transform.scale(rock_left, (tile_size, tile_size))
-        rock_right = tile_sheet.image_at((112 + 16 * 5, 0, 16, 16), (255, 255, 255))
-        rock_right = pg.transform.scale(rock_right, (tile_size, tile_size))
-        rock_floor = tile_sheet.image_at((112 + 16 * 4, 0, 16, 16), (255, 255, 255))
-        rock_floor = pg.transform.scale(rock_floor, (tile_size, tile_size))
-        grey_rock_lwall = tile_sheet.image_at((112 + 16 * 3, 16 * 3, 16, 16), (255, 255, 255))
-        grey_rock_lwall = pg.transform.scale(grey_rock_lwall, (tile_size, tile_size))
-        grey_rock_rwall = tile_sheet.image_at((112 + 16 * 5, 16 * 3, 16, 16), (255, 255, 255))
-        grey_rock_rwall = pg.transform.scale(grey_rock_rwall, (tile_size, tile_size))
-        grey_rock_left = tile_sheet.image_at((112 + 16 * 3, 16 * 2, 16, 16), (255, 255, 255))
-        grey_rock_left = pg.transform.scale(grey_rock_left, (tile_size, tile_size))
-        grey_rock_right = tile_sheet.image_at((112 + 16 * 5, 16 * 2, 16, 16), (255, 255, 255))
-        grey_rock_right = pg.transform.scale(grey_rock_right, (tile_size, tile_size))
-        grey_rock_floor = tile_sheet.image_at((112 + 16 * 4, 16 * 2, 16, 16), (255, 255, 255))
-        grey_rock_floor = pg.transform.scale(grey_rock_floor, (tile_size, tile_size))
-        inside = tile_sheet.image_at((112 + 16 * 4, 16, 16, 16), (255, 255, 255))
-        inside = pg.transform.scale(inside, (tile_size, tile_size))
-        rock_pillar_top = tile_sheet.image_at((112 + 16 * 6, 0, 16, 16), (255, 255, 255))
-        rock_pillar_top = pg.transform.scale(rock_pillar_top, (tile_size, tile_size))
-        rock_pillar = tile_sheet.image_at((112 + 16 * 6, 16, 16, 16), (255, 255, 255))
-        rock_pillar = pg.transform.scale(rock_pillar, (tile_size, tile_size))
-        grey_rock_pillar_top = tile_sheet.image_at((112 + 16 * 6, 16 * 2, 16, 16), (255, 255, 255))
-        grey_rock_pillar_top = pg.transform.scale(grey_rock_pillar_top, (tile_size, tile_size))
-        grey_rock_pillar = tile_sheet.image_at((112 + 16 * 6, 16 * 3, 16, 16), (255, 255, 255))
-        grey_rock_pillar = pg.transform.scale(grey_rock_pillar, (tile_size, tile_size))
-        grass_ltop = tile_sheet.image_at((112 + 16 * 4, 16 * 4, 16, 16), (255, 255, 255))
-        grass_ltop = pg.transform.scale(grass_ltop, (tile_size, tile_size))
-        grass_l = tile_sheet.image_at((112 + 16 * 4, 16 * 5, 16, 16), (255, 255, 255))
-        grass_l = pg.transform.scale(grass_l, (tile_size, tile_size))
-        grass_lbot = tile_sheet.image_at((112 + 16 * 4, 16 * 6, 16, 16), (255, 255, 255))
-        grass_lbot = pg.transform.scale(grass_lbot, (tile_size, tile_size))
-        grass_top = tile_sheet.image_at((112 + 16 * 5, 16 * 4, 16, 16), (255, 255, 255))
-        grass_top = pg.transform.scale(grass_top, (tile_size, tile_size))
-        grass_mid = tile_sheet.image_at((112 + 16 * 5, 16 * 5, 16, 16), (255, 255, 255))
-        grass_mid = pg.transform.scale(grass_mid, (tile_size, tile_size))
-        grass_bot = tile_sheet.image_at((112 + 16 * 5, 16 * 6, 16, 16), (255, 255, 255))
-        grass_bot = pg.transform.scale(grass_bot, (tile_size, tile_size))
-        grass_rtop = tile_sheet.image_at((112 + 16 * 4, 16 * 4, 16, 16), (255, 255, 255))
-        grass_rtop = pg.transform.scale(grass_rtop, (tile_size, tile_size))
-        grass_r = tile_sheet.image_at((112 + 16 * 4, 16 * 5, 16, 16), (255, 255, 255))
-        grass_r = pg.transform.scale(grass_r, (tile_size, tile_size))
-        grass_rbot = tile_sheet.image_at((112 + 16 * 4, 16 * 6, 16, 16), (255, 255, 255))
-        grass_rbot = pg.transform.scale(grass_rbot, (tile_size, tile_size))
-
-        for i, row in enumerate(level_layout):
-            for j, col in enumerate(row):
-                x_val = j * tile_size // 2
-                y_val = i * tile_size
-
-                if col == "1":
-                    img_rect = rock_green1.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_green1, img_rect)
-                    self.tile_list.append(tile)
-                if col == "2":
-                    img_rect = rock_green2.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_green2, img_rect)
-                    self.tile_list.append(tile)
-                if col == "3":
-                    img_rect = rock_green3.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_green3, img_rect)
-                    self.tile_list.append(tile)
-                if col == "L":
-                    img_rect = rock_green_left.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_green_left, img_rect)
-                    self.tile_list.append(tile)
-                if col == "R":
-                    img_rect = rock_green_right.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_green_right, img_rect)
-                    self.tile_list.append(tile)
-                if col == "4":
-                    img_rect = grey_rock_green1.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_green1, img_rect)
-                    self.tile_list.append(tile)
-                if col == "5":
-                    img_rect = grey_rock_green2.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_green2, img_rect)
-                    self.tile_list.append(tile)
-                if col == "6":
-                    img_rect = grey_rock_green3.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_green3, img_rect)
-                    self.tile_list.append(tile)
-                if col == "l":
-                    img_rect = grey_rock_green_left.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_green_left, img_rect)
-                    self.tile_list.append(tile)
-                if col == "r":
-                    img_rect = grey_rock_green_right.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_green_right, img_rect)
-                    self.tile_list.append(tile)
-                if col == "U":
-                    img_rect = rocky.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rocky, img_rect)
-                    self.tile_list.append(tile)
-                if col == "u":
-                    img_rect = grey_rocky.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rocky, img_rect)
-                    self.tile_list.append(tile)
-                if col == "N":
-                    img_rect = rock_lwall.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_lwall, img_rect)
-                    self.tile_list.append(tile)
-                if col == "M":
-                    img_rect = rock_rwall.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_rwall, img_rect)
-                    self.tile_list.append(tile)
-                if col == "A":
-                    img_rect = rock_left.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_left, img_rect)
-                    self.tile_list.append(tile)
-                if col == "D":
-                    img_rect = rock_right.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_right, img_rect)
-                    self.tile_list.append(tile)
-                if col == "n":
-                    img_rect = grey_rock_lwall.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_lwall, img_rect)
-                    self.back_list.append(tile)
-                if col == "m":
-                    img_rect = grey_rock_rwall.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_rwall, img_rect)
-                    self.back_list.append(tile)
-                if col == "a":
-                    img_rect = grey_rock_left.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_left, img_rect)
-                    self.tile_list.append(tile)
-                if col == "d":
-                    img_rect = grey_rock_right.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_right, img_rect)
-                    self.tile_list.append(tile)
-                if col == "F":
-                    img_rect = rock_floor.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_floor, img_rect)
-                    self.tile_list.append(tile)
-                if col == "f":
-                    img_rect = rock_floor.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_floor, img_rect)
-                    self.tile_list.append(tile)
-                if col == "-":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (inside, img_rect)
-                    self.back_list.append(tile)
-                if col == "A":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_pillar_top, img_rect)
-                    self.tile_list.append(tile)
-                if col == "I":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (rock_pillar, img_rect)
-                    self.tile_list.append(tile)
-                if col == "a":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_pillar_top, img_rect)
-                    self.tile_list.append(tile)
-                if col == "i":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grey_rock_pillar, img_rect)
-                    self.tile_list.append(tile)
-                if col == "7":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grass_ltop, img_rect)
-                    self.back_list.append(tile)
-                    self.end_list.append(tile)
-                if col == "y":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grass_l, img_rect)
-                    self.back_list.append(tile)
-                    self.end_list.append(tile)
-                if col == "j":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grass_lbot, img_rect)
-                    self.back_list.append(tile)
-                    self.end_list.append(tile)
-                if col == "8":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grass_top, img_rect)
-                    self.back_list.append(tile)
-                    self.end_list.append(tile)
-                if col == "=":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grass_mid, img_rect)
-                    self.back_list.append(tile)
-                    self.end_list.append(tile)
-                if col == "k":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grass_bot, img_rect)
-                    self.back_list.append(tile)
-                    self.end_list.append(tile)
-                if col == "9":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grass_rtop, img_rect)
-                    self.back_list.append(tile)
-                    self.end_list.append(tile)
-                if col == "o":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grass_r, img_rect)
-                    self.back_list.append(tile)
-                    self.end_list.append(tile)
-                if col == ";":
-                    img_rect = inside.get_rect()
-                    img_rect.x = x_val
-                    img_rect.y = y_val
-                    tile = (grass_r, img_rect)
-                    self.back_list.append(tile)
-                    self.end_list.append(tile)
-                if col == "p":
-                    player = Player(run_rt_list, self.tile_list, self.next)
-                    player.rect.x = x_val
-                    player.rect.y = y_val
-                    self.player_group.add(player)
-                if col == "x":
-                    enemy = Enemy(run_enemy_list, self.tile_list)
-                    enemy.rect.x = x_val
-                    enemy.rect.y = y_val
-                    self.enemy_group.add(enemy)
-                elif col == "0":
-                    pass
-
-    def draw(self, display):
-        for tile in self.tile_list:
-            display.blit(tile[0], tile[1])
-        for tile in self.back_list:
-            display.blit(tile[0], tile[1])
-
-        self.player_group.draw(display)
-        self.enemy_group.draw(display)
+    def reload_level(self, level):
+        """Swap in an edited copy of the level, rebuilding only the columns that changed.
 
-    def update(self):
-        self.player_group.update()
+        The player, enemies and camera stay as they are, except that enemies
+        added to columns that are already loaded are spawned. Columns that
+        aren't loaded just load from the new level later, and enemies added
+        to chunks that were loaded before spawn when they load again. Returns the
+        number of cells that changed, or None if the level changed size and
+        has to be rebuilt instead.
+        """
+        old = self.level
+        if (level.width, level.height) != (old.width, old.height):
+            return None
+        rows = level.height
+        self.level = level
+        if self.swarm is not None:
+            # loaded columns keep their solid cells until the changed ones are loaded again below
+            self.swarm.level = level
+
+        # compare a chunk of columns at a time, and only look at single cells where those differ
+        changed = 0
+        columns = set()
+        block = CHUNK_COLS * rows
+        for start in range(0, len(level.cells), block):
+            before = bytes(old.cells[start:start + block])
+            after = bytes(level.cells[start:start + block])
+            if before == after:
+                continue
+            for i in range(len(after)):
+                if before[i] == after[i]:
+                    continue
+                changed += 1
+                col, row = divmod(start + i, rows)
+                added = LAYERS[after[i]] == ENEMY and LAYERS[before[i]] != ENEMY
+                chunk = col // CHUNK_COLS
+                if self.streaming and chunk not in self.loaded:
+                    # a chunk that never loaded spawns its enemies from the new level anyway
+                    if chunk in self.spawned:
+                        pending = self.pending.setdefault(chunk, set())
+                        if added:
+                            pending.add((col, row))
+                        elif LAYERS[after[i]] != ENEMY:
+                            pending.discard((col, row))
+                    continue
+                columns.add(col)
+                if added:
+                    self.spawn_enemy(col * self.tile_size, row * self.tile_size)
+
+        for col in columns:
+            for grid in (self.tile_grid, self.back_grid, self.end_grid):
+                grid.remove_columns(col, col + 1)
+            self.load_columns(col, col + 1, spawn=False)
+            self.chunks.invalidate_columns(col, col + 1)
+        self.repaint()
+        return changed
+
+    def load_chunk(self, chunk):
+        if chunk in self.loaded or not 0 <= chunk * CHUNK_COLS < self.level.width:
+            return
+        self.load_columns(chunk * CHUNK_COLS, (chunk + 1) * CHUNK_COLS, chunk not in self.spawned)
+        for col, row in self.pending.pop(chunk, ()):
+            self.spawn_enemy(col * self.tile_size, row * self.tile_size)
+        self.loaded.add(chunk)
+        self.spawned.add(chunk)
+        self.chunks.invalidate_columns(chunk * CHUNK_COLS, (chunk + 1) * CHUNK_COLS)
+
+    def unload_chunk(self, chunk):
+        self.loaded.discard(chunk)
+        for grid in (self.tile_grid, self.back_grid, self.end_grid):
+            grid.remove_columns(chunk * CHUNK_COLS, (chunk + 1) * CHUNK_COLS)
+        if self.swarm is not None:
+            self.swarm.unload_columns(chunk * CHUNK_COLS, (chunk + 1) * CHUNK_COLS)
+        self.chunks.invalidate_columns(chunk * CHUNK_COLS, (chunk + 1) * CHUNK_COLS)
+
+    def stream(self):
+        """Page column chunks in and out so only STREAM_CHUNKS either side of the view stay loaded."""
+        chunk_width = CHUNK_COLS * self.tile_size
+        first = self.view.x // chunk_width - STREAM_CHUNKS
+        last = (self.view.x + self.view.width - 1) // chunk_width + STREAM_CHUNKS
+        for chunk in range(first, last + 1):
+            self.load_chunk(chunk)
+
+        # keep one extra chunk either side so walking back and forth doesn't thrash
+        player_chunk = self.player.rect.x // chunk_width if self.player else None
+        for chunk in list(self.loaded):
+            if (chunk < first - 1 or chunk > last + 1) and chunk != player_chunk:
+                self.unload_chunk(chunk)
+
+    def prepare(self):
+        """Pre-render the chunks on screen at the start, see preload.py."""
+        if CHUNK_RENDER:
+            self.chunks.warm(self.view.x, self.view)
+
+    def draw(self, display, alpha=1.0):
+        """Draw the level. alpha blends positions between the last two steps (1 is the latest)."""
+        offset_x = self.draw_offset(alpha)
+        self.draw_tiles(display, offset_x)
+        self.draw_sprites(display, self.player_group, offset_x, alpha)
+        self.draw_sprites(display, self.enemy_group, offset_x, alpha)
+        if self.swarm is not None:
+            self.swarm.draw(display, offset_x, alpha)
+
+    def draw_offset(self, alpha):
+        offset_x = self.view.x
+        if alpha < 1.0:
+            offset_x = round(self.prev_view_x + (offset_x - self.prev_view_x) * alpha)
+        return offset_x
+
+    def draw_tiles(self, display, offset_x):
+        # everything is stored in world coordinates, the camera offset is only applied here
+        # and only the columns that are on screen get looked up
+        if CHUNK_RENDER:
+            self.chunks.draw(display, offset_x, self.view)
+        else:
+            col_start, col_end = self.view.columns(self.tile_size, offset_x)
+            display.blits([(tile[0], (tile[1].x - offset_x, tile[1].y))
+                           for tile in self.tile_grid.columns(col_start, col_end)], False)
+            display.blits([(tile[0], (tile[1].x - offset_x, tile[1].y))
+                           for tile in self.back_grid.columns(col_start, col_end)], False)
+
+    def sprite_position(self, sprite, alpha):
+        x, y = sprite.rect.topleft
+        if alpha < 1.0:
+            prev_x, prev_y = self.prev_positions.get(sprite, (x, y))
+            x = round(prev_x + (x - prev_x) * alpha)
+            y = round(prev_y + (y - prev_y) * alpha)
+        return x, y
+
+    def draw_sprites(self, display, group, offset_x, alpha):
+        right = offset_x + self.view.width
+        batch = []
+        for sprite in group:
+            x, y = self.sprite_position(sprite, alpha)
+            if x + sprite.rect.width > offset_x and x < right:
+                batch.append((sprite.image, (x - offset_x, y)))
+        display.blits(batch, False)
+
+    def repaint(self):
+        """Make the next draw_dirty() redraw the whole screen."""
+        self.drawn_offset = None
+
+    def draw_dirty(self, display, alpha=1.0, extra=()):
+        """Redraw only the parts of the screen that changed since the last call.
+
+        Returns the screen rects to pass to pygame.display.update(), or None
+        after a full redraw, which happens whenever the camera offset changes.
+        extra are rects that need repainting as well, like the profiler overlay.
+        """
+        offset_x = self.draw_offset(alpha)
+        right = offset_x + self.view.width
+        drawn = {}
+        for group in (self.player_group, self.enemy_group):
+            for sprite in group:
+                x, y = self.sprite_position(sprite, alpha)
+                if x + sprite.rect.width > offset_x and x < right:
+                    drawn[sprite] = (pygame.Rect(x - offset_x, y, sprite.rect.width, sprite.rect.height),
+                                     sprite.image)
+
+        # a swarm keeps no per enemy rects, so the screen is redrawn while one is alive
+        if offset_x != self.drawn_offset or self.swarm:
+            display.fill(SKY)
+            self.draw_tiles(display, offset_x)
+            display.blits([(image, rect) for rect, image in drawn.values()], False)
+            if self.swarm is not None:
+                self.swarm.draw(display, offset_x, alpha)
+            self.drawn_offset = offset_x
+            self.drawn = drawn
+            return None
+
+        # repaint the background wherever a sprite was or now is, then every sprite on top
+        previous = self.drawn
+        dirty = [rect for sprite, (rect, image) in drawn.items() if previous.get(sprite) != (rect, image)]
+        dirty += [rect for sprite, (rect, image) in previous.items() if drawn.get(sprite) != (rect, image)]
+        dirty += extra
+        for rect in dirty:
+            display.set_clip(rect)
+            display.fill(SKY)
+            self.draw_tiles(display, offset_x)
+        display.set_clip(None)
+        if dirty:
+            display.blits([(image, rect) for rect, image in drawn.values()], False)
+        self.drawn = drawn
+        return dirty
+
+    def update(self, keys=None):
+        """Advance one fixed step. keys is an inputs.KeyState, read from the keyboard when not given."""
+        if keys is None:
+            keys = read_keyboard()
+        self.keys = keys
+
+        # remember where everything was so draw() can blend between steps
+        self.prev_view_x = self.view.x
+        self.prev_positions = {sprite: sprite.rect.topleft for sprite in self.player_group}
+        for sprite in self.enemy_group:
+            self.prev_positions[sprite] = sprite.rect.topleft
+        if self.swarm is not None:
+            self.swarm.snapshot()
+
+        self.clock.tick()
+        self.player_group.update(keys)
+        profile.lap("player")
         self.enemy_group.update()
+        if self.swarm is not None:
+            self.swarm.update()
+        self.animations.tick()
+        profile.lap("enemies")
         self.camera()
+        if self.streaming:
+            self.stream()
+        self.enemy_phase.rebuild(self.enemy_group)
+        profile.lap("camera")
 
     def camera(self):
         self.player = self.player_group.sprites()[0]
-        keys = pygame.key.get_pressed()
-        for tile in self.tile_list:
-            if tile[1].colliderect(self.player.rect.x + self.player.change_x,
-                                   self.player.rect.y,
-                                   self.player.rect.width,
-                                   self.player.rect.height):
-                self.change_x = 0
-
-        if self.player.rect.x > 200 and self.player.rect.x < WIN_WIDTH - 200:
-            self.change_x = 0
-
-        if self.player.rect.x >= WIN_WIDTH - 200:
-            if self.player.change_x > 0:
-                self.player.change_x = 0
-                self.change_x = -2
-        if self.player.rect.x <= 200:
-            if self.player.change_x < 0:
-                self.player.change_x = 0
-                self.change_x = 2
-        if not keys[pygame.K_LEFT] and not keys[pygame.K_RIGHT]:
-            self.change_x = 0
-
-        for tile in self.tile_list:
-            if tile[1].colliderect(self.player.rect.x + self.player.change_x,
-                                   self.player.rect.y,
-                                   self.player.rect.width,
-                                   self.player.rect.height):
-                self.change_x = 0
-
-        for tile in self.tile_list:
-            tile[1].x += self.change_x
-        for tile in self.back_list:
-            tile[1].x += self.change_x
-        for enemy in self.enemy_group:
-            enemy.rect.x += self.change_x
+        self.view.follow(self.player, self.tile_grid, self.keys.left, self.keys.right)
+
+    def memory_report(self):
+        """Approximate bytes held by this layout's tiles, entities and chunk surfaces."""
+        grids = (self.tile_grid, self.back_grid, self.end_grid)
+        tiles = sum(grid.count for grid in grids)
+        tile_bytes = sum(grid.nbytes() for grid in grids)
+        entities = self.player_group.sprites() + self.enemy_group.sprites()
+        entity_bytes = sum(entity_size(entity) for entity in entities)
+        chunk_bytes = sum(surface.get_width() * surface.get_height() * surface.get_bytesize()
+                          for surface in self.chunks.chunks.values() if surface is not None)
+        report = {
+            "level_bytes": len(self.level.cells),
+            "tiles": tiles,
+            "tile_bytes": tile_bytes,
+            "bytes_per_tile": tile_bytes / tiles if tiles else 0,
+            "entities": len(entities),
+            "entity_bytes": entity_bytes,
+            "bytes_per_entity": entity_bytes / len(entities) if entities else 0,
+            "chunk_bytes": chunk_bytes,
+        }
+        if self.swarm is not None:
+            swarm_bytes = self.swarm.nbytes()
+            report["swarm_enemies"] = len(self.swarm)
+            report["swarm_bytes"] = swarm_bytes
+            report["bytes_per_swarm_enemy"] = swarm_bytes / len(self.swarm.x)
+        return report
+
+    def enemy_rects(self):
+        """(x, y, w, h) of every live enemy, sprites or swarm."""
+        rects = [tuple(enemy.rect) for enemy in self.enemy_group]
+        if self.swarm is not None:
+            rects += self.swarm.rects()
+        return rects
 
     def Kill_Player(self):
-        if pygame.sprite.groupcollide(self.player_group, self.enemy_group, False, True):
+        # broadphase instead of groupcollide's test of every pair, rebuilt by update()
+        if self.enemy_phase.collide(self.player_group, kill=True):
+            return False
+        if self.swarm is not None and self.swarm.collide(self.player.rect, kill=True):
             return False
         if self.player.rect.y > WIN_HEIGHT + 75:
             return False
 
     def Next_Level(self):
-        for tile in self.end_list:
+        for tile in self.end_grid.query_move(self.player.rect, self.player.change_x, 0):
             if tile[1].colliderect(self.player.rect.x + self.player.change_x,
                                    self.player.rect.y,
                                    self.player.rect.width,
@@ -659,12 +658,8 @@ class Layout:
                 return False
 
     def Cont(self):
-        characters = SpriteSheet("images/characters.png")
-        run_enemy_list = characters.load_grid_images(1, 23, player_x, player_x_pad, 101, player_y_pad, width, height,
-                                                     -1)
-        if len(self.enemy_group) < 4:
-            enemy = Enemy(run_enemy_list, self.tile_list)
-            enemy.rect.x = 800
-            enemy.rect.y = 720
-            self.enemy_group.add(enemy)
-
+        if self.spawner is not None:
+            enemy = self.spawner.update()
+            # a recycled enemy may have died this step, don't draw it coming from there
+            if enemy is not None:
+                self.prev_positions.pop(enemy, None)
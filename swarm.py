@@ -0,0 +1,224 @@
+# Batched enemies.
+# A Swarm holds every enemy of a Layout as NumPy arrays (positions, speeds,
+# animation state, alive flags) and steps them all at once, testing them
+# against a boolean solid-tile grid instead of a per-enemy tile loop. It
+# follows the same rules as sprites.Enemy step for step, including pygame's
+# rounding of float rect coordinates, so a level plays out the same either
+# way. Turned on with SWARM in settings; needs numpy.
+
+import numpy as np
+
+from settings import *
+from animation import ENEMY_WALK
+from level import LAYERS, SOLID
+
+
+def round_rect(values):
+    """Round like assigning floats to a pygame.Rect: halves away from zero."""
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+class Swarm:
+    """All enemies of a level. frames is the assets.FrameSet of the enemy walk frames."""
+
+    def __init__(self, frames, tile_size, level, view, animations, capacity=64):
+        # image 0 is the right facing spawn frame, 1.. are the left facing walk frames
+        self.images = [frames.right[0]] + list(frames.left)
+        self.width, self.height = frames.right[0].get_size()
+        self.tile_size = tile_size
+        self.view = view
+        # the walk frame every enemy is on, kept in step with the sprites' animation.AnimationClock
+        self.animations = animations
+        self.shown = animations.frame(ENEMY_WALK)
+
+        # solid[col - first_col, row] for the span of columns the layout has loaded,
+        # read from the level a chunk at a time by load_columns()
+        self.level = level
+        self.layers = np.frombuffer(LAYERS, dtype=np.uint8)
+        self.first_col = 0
+        self.solid = np.zeros((0, level.height), dtype=np.bool_)
+        self.span_cols = (self.width - 1) // tile_size + 2
+        self.span_rows = (self.height - 1) // tile_size + 2
+
+        self.count = 0
+        self.alive_count = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        def grow(array, dtype):
+            new = np.zeros(capacity, dtype=dtype)
+            if array is not None:
+                new[:self.count] = array[:self.count]
+            return new
+
+        self.x = grow(getattr(self, "x", None), np.int64)
+        self.y = grow(getattr(self, "y", None), np.int64)
+        self.prev_x = grow(getattr(self, "prev_x", None), np.int64)
+        self.prev_y = grow(getattr(self, "prev_y", None), np.int64)
+        self.change_x = grow(getattr(self, "change_x", None), np.float64)
+        self.change_y = grow(getattr(self, "change_y", None), np.float64)
+        self.image = grow(getattr(self, "image", None), np.int8)
+        self.alive = grow(getattr(self, "alive", None), np.bool_)
+
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.x, self.y, self.prev_x, self.prev_y, self.change_x,
+                                              self.change_y, self.image, self.alive))
+
+    def __len__(self):
+        return self.alive_count
+
+    def load_columns(self, col_start, col_end):
+        """Read which cells of the columns are solid from the level, only touching those columns."""
+        rows = self.level.height
+        if col_end <= col_start:
+            return
+        cells = np.frombuffer(self.level.cells, dtype=np.uint8, count=(col_end - col_start) * rows,
+                              offset=col_start * rows).reshape(-1, rows)
+        self.cover(col_start, col_end)
+        first = self.first_col
+        self.solid[col_start - first:col_end - first] = self.layers[cells] == SOLID
+
+    def unload_columns(self, col_start, col_end):
+        first = self.first_col
+        self.solid[max(col_start - first, 0):max(col_end - first, 0)] = False
+        # unloaded columns have nothing solid, so trim them off either end
+        kept = np.flatnonzero(self.solid.any(axis=1))
+        if not len(kept):
+            self.first_col = 0
+            self.solid = self.solid[:0].copy()
+        elif kept[0] or kept[-1] < len(self.solid) - 1:
+            self.first_col = first + int(kept[0])
+            self.solid = self.solid[kept[0]:kept[-1] + 1].copy()
+
+    def cover(self, col_start, col_end):
+        """Grow solid so it spans columns col_start up to (not including) col_end."""
+        first = self.first_col
+        last = first + len(self.solid)
+        if len(self.solid):
+            col_start = min(col_start, first)
+            col_end = max(col_end, last)
+        if (col_start, col_end) == (first, last):
+            return
+        solid = np.zeros((col_end - col_start, self.level.height), dtype=np.bool_)
+        solid[first - col_start:last - col_start] = self.solid
+        self.first_col = col_start
+        self.solid = solid
+
+    def spawn(self, x, y):
+        """Add an enemy at (x, y) in the state Enemy.reset() leaves it in."""
+        if self.count == len(self.x):
+            self.compact()
+            if self.count == len(self.x):
+                self.allocate(len(self.x) * 2)
+        i = self.count
+        self.count += 1
+        self.alive_count += 1
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.change_x[i] = 0
+        self.change_y[i] = 1.0
+        self.image[i] = 0
+        self.alive[i] = True
+
+    def compact(self):
+        """Drop dead enemies, keeping the rest in spawn order so they draw in the same order."""
+        keep = np.flatnonzero(self.alive[:self.count])
+        n = len(keep)
+        for array in (self.x, self.y, self.prev_x, self.prev_y, self.change_x, self.change_y,
+                      self.image, self.alive):
+            array[:n] = array[keep]
+        self.alive[n:self.count] = False
+        self.count = n
+
+    def snapshot(self):
+        """Remember positions for interpolated drawing, like Layout.prev_positions."""
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+
+    def hits(self, x, y):
+        """True where an enemy sized box at (x, y) overlaps a solid tile."""
+        tile_size = self.tile_size
+        cols, rows = self.solid.shape
+        if not cols:
+            return np.zeros(len(x), dtype=np.bool_)
+        col_first = x // tile_size - self.first_col
+        col_last = (x + self.width - 1) // tile_size - self.first_col
+        row_first = y // tile_size
+        row_last = (y + self.height - 1) // tile_size
+        hit = np.zeros(len(x), dtype=np.bool_)
+        for dc in range(self.span_cols):
+            col = col_first + dc
+            for dr in range(self.span_rows):
+                row = row_first + dr
+                inside = (col <= col_last) & (row <= row_last) & (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+                hit |= inside & self.solid[np.clip(col, 0, cols - 1), np.clip(row, 0, rows - 1)]
+        return hit
+
+    def update(self):
+        """Enemy.update() for every enemy at once."""
+        # like AnimationClock.tick(), every enemy moves on to a new walk frame together
+        index = self.animations.frame(ENEMY_WALK)
+        turned = index != self.shown
+        self.shown = index
+
+        n = self.count
+        if not self.alive_count:
+            return
+        alive = self.alive[:n]
+        x, y = self.x[:n], self.y[:n]
+        change_x, change_y = self.change_x[:n], self.change_y[:n]
+
+        x[alive] = round_rect(x[alive] + change_x[alive])
+        y[alive] = round_rect(y[alive] + change_y[alive])
+        change_y[alive] = 3.5
+
+        screen_x = x - self.view.x
+        change_x[alive] = -0.5
+        change_x[(screen_x <= 0) | (screen_x >= WIN_WIDTH)] = 0
+
+        # colliderect() truncates float arguments, so the probes do too
+        change_x[alive & self.hits(x + np.trunc(change_x).astype(np.int64), y)] = 0
+        change_y[alive & (change_y > 0) & self.hits(x, y + np.trunc(change_y).astype(np.int64))] = 0
+
+        dead = alive & ((y > WIN_HEIGHT + 75) | (screen_x < 0))
+        if dead.any():
+            alive[dead] = False
+            self.alive_count -= int(dead.sum())
+        if turned:
+            self.image[:n][alive] = index + 1
+
+    def collide(self, rect, kill=False):
+        """Number of live enemies overlapping rect, killing them with kill (like spritecollide)."""
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        hit = (self.alive[:n] & (x < rect.right) & (x + self.width > rect.left) &
+               (y < rect.bottom) & (y + self.height > rect.top))
+        count = int(hit.sum())
+        if kill and count:
+            self.alive[:n][hit] = False
+            self.alive_count -= count
+        return count
+
+    def rects(self):
+        return [(int(x), int(y), self.width, self.height)
+                for x, y in zip(self.x[:self.count][self.alive[:self.count]],
+                                self.y[:self.count][self.alive[:self.count]])]
+
+    def positions(self, offset_x, alpha=1.0):
+        """Screen positions and images of the live enemies that are in view."""
+        n = self.count
+        alive = self.alive[:n]
+        x, y = self.x[:n][alive], self.y[:n][alive]
+        if alpha < 1.0:
+            prev_x, prev_y = self.prev_x[:n][alive], self.prev_y[:n][alive]
+            x = np.round(prev_x + (x - prev_x) * alpha).astype(np.int64)
+            y = np.round(prev_y + (y - prev_y) * alpha).astype(np.int64)
+        visible = (x + self.width > offset_x) & (x < offset_x + self.view.width)
+        return x[visible] - offset_x, y[visible], self.image[:n][alive][visible]
+
+    def draw(self, display, offset_x, alpha=1.0):
+        images = self.images
+        x, y, image = self.positions(offset_x, alpha)
+        display.blits([(images[i], (sx, sy)) for sx, sy, i in zip(x.tolist(), y.tolist(), image.tolist())],
+                      False)
@@ -0,0 +1,62 @@
+# Fixed timestep helpers.
+# The game rules always advance in steps of 1 / SIM_HZ seconds, however fast
+# frames are drawn. Movement in sprites.py is in pixels per step on integer
+# rects, so it is tuned for SIM_HZ as set in settings.py and is not rescaled
+# for other tick rates.
+
+import time
+
+from settings import *
+
+STEP_MS = 1000 / SIM_HZ
+
+
+class SimClock:
+    """Simulated milliseconds, advanced once per fixed step instead of read from the wall clock."""
+
+    def __init__(self):
+        self.now = 0
+        self.ticks = 0
+
+    def tick(self):
+        self.ticks += 1
+        self.now = self.ticks * STEP_MS
+
+
+class FixedTimestep:
+    """Turns real frame times into a number of fixed steps to run plus a blend factor.
+
+    alpha is how far the renderer is between the last two steps, used to
+    interpolate positions when drawing. At most max_steps are run per frame;
+    any time beyond that is dropped so a slow frame can't snowball.
+    """
+
+    def __init__(self, hz=SIM_HZ, max_steps=MAX_STEPS_PER_FRAME):
+        self.step = 1 / hz
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.previous = None
+
+    def advance(self):
+        """Add the time since the last call and return how many steps are due."""
+        now = time.perf_counter()
+        if self.previous is None:
+            self.previous = now - self.step
+        self.accumulator += now - self.previous
+        self.previous = now
+
+        steps = int(self.accumulator // self.step)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+    @property
+    def alpha(self):
+        return min(self.accumulator / self.step, 1.0)
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.previous = None
@@ -0,0 +1,181 @@
+# Vectorized environments.
+# Steps many independent games in lock-step across a pool of worker
+# processes, for automated agents and balance sweeps. Every worker runs a few
+# Games headless, each on its own level, and each step sends every game one
+# action and gets back what happened:
+#
+#     with VecEnv(16, level=2) as env:
+#         obs = env.reset()
+#         obs, dead, done = env.step([RIGHT | JUMP] * 16)
+#
+#     python vecenv.py --envs 16 --steps 20000
+#
+# Actions are KeyStates or replay.py key bits. A game that dies or finishes
+# its level starts that level again on the next step.
+
+import headless
+
+import argparse
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+from settings import *
+from game import Game
+from inputs import IDLE
+from replay import decode_keys, LEFT, RIGHT, JUMP
+
+# Player position and vertical speed in world pixels, camera position and the
+# enemies on screen as (x, y) pairs
+Observation = namedtuple("Observation", "x y change_y view_x enemies")
+
+
+class ActionInput:
+    """Input provider holding the action set by the last VecEnv step."""
+
+    def __init__(self):
+        self.state = IDLE
+
+    def poll(self):
+        return self.state
+
+
+def observe(game):
+    layout = game.layout
+    player = layout.player_group.sprites()[0]
+    view = layout.view
+    enemies = tuple((x, y) for x, y, w, h in layout.enemy_rects() if view.x - w < x < view.x + view.width)
+    return Observation(player.rect.x, player.rect.y, player.change_y, view.x, enemies)
+
+
+def make_game(levels, level):
+    # the whole level list, so the layout keeps its level number (spawners, jump sound)
+    game = Game(ActionInput(), levels, level, preload=False)
+    game.game_state = 0
+    return game
+
+
+def step_game(game, level, action):
+    """One step of one game playing level. Returns (observation, dead, done)."""
+    game.controls.state = decode_keys(action) if isinstance(action, int) else action
+    game.step()
+    dead = game.game_state == 1
+    done = game.next != level
+    game.game_state = 0
+    if done:
+        game.next = level
+        game.reset_game()
+    return observe(game), dead, done
+
+
+def worker(conn, levels, played):
+    """Runs a game for each level number in played, answering commands from a VecEnv until told to close."""
+    headless.init()
+    games = [make_game(levels, level) for level in played]
+    while True:
+        command, actions = conn.recv()
+        if command == "step":
+            conn.send([step_game(game, level, action) for game, level, action in zip(games, played, actions)])
+        elif command == "reset":
+            games = [make_game(levels, level) for level in played]
+            conn.send([observe(game) for game in games])
+        elif command == "close":
+            conn.close()
+            return
+
+
+class VecEnv:
+    """count games stepped together by up to workers processes (one per CPU by default).
+
+    level is the level every game plays, or a list with one level per game.
+    """
+
+    def __init__(self, count, level=0, workers=None, levels=LEVELS):
+        self.count = count
+        self.levels = level if isinstance(level, list) else [level] * count
+        workers = min(workers or os.cpu_count() or 1, count)
+
+        # games are split into contiguous slices, one per worker
+        bounds = [count * i // workers for i in range(workers + 1)]
+        self.slices = [slice(start, end) for start, end in zip(bounds, bounds[1:])]
+
+        # spawn rather than fork, so workers don't inherit the parent's SDL state
+        context = multiprocessing.get_context("spawn")
+        self.conns = []
+        self.processes = []
+        for part in self.slices:
+            conn, child = context.Pipe()
+            process = context.Process(target=worker, args=(child, levels, self.levels[part]), daemon=True)
+            process.start()
+            child.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+
+    def send(self, command, actions=None):
+        for conn, part in zip(self.conns, self.slices):
+            conn.send((command, actions[part] if actions is not None else None))
+        results = []
+        for conn in self.conns:
+            results.extend(conn.recv())
+        return results
+
+    def reset(self):
+        """Start every game on its level again. Returns the first observations."""
+        return self.send("reset")
+
+    def step(self, actions):
+        """Step every game once with its action.
+
+        Returns lists of observations, death flags (from Kill_Player) and level
+        complete flags (from Next_Level), one entry per game.
+        """
+        if len(actions) != self.count:
+            raise ValueError(f"expected {self.count} actions, got {len(actions)}")
+        results = self.send("step", list(actions))
+        obs, dead, done = zip(*results)
+        return list(obs), list(dead), list(done)
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(("close", None))
+            conn.close()
+        for process in self.processes:
+            process.join()
+        self.conns = []
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Step many headless games in parallel.")
+    parser.add_argument("--envs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--workers", type=int, default=None, help="processes to use, one per CPU by default")
+    parser.add_argument("--level", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=5000)
+    args = parser.parse_args()
+
+    policies = [headless.random_policy(seed) for seed in range(args.envs)]
+    deaths = 0
+    finished = 0
+    with VecEnv(args.envs, args.level, args.workers) as env:
+        env.reset()
+        start = time.perf_counter()
+        for frame in range(args.steps):
+            obs, dead, done = env.step([policy(frame) for policy in policies])
+            deaths += sum(dead)
+            finished += sum(done)
+        elapsed = time.perf_counter() - start
+
+    total = args.envs * args.steps
+    print(f"{total} steps over {args.envs} games in {elapsed:.3f}s ({total / elapsed:.0f} steps/s)")
+    print(f"deaths: {deaths}  levels finished: {finished}")
+
+
+if __name__ == "__main__":
+    main()